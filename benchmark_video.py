@@ -0,0 +1,54 @@
+"""
+Compares the video rendering engines on the sample frames in output/.
+
+Usage:
+    python benchmark_video.py [--runs 3] [--frames output] [--audio output/final_voiceover.mp3]
+"""
+import argparse
+import glob
+import os
+import re
+import tempfile
+import time
+from src.media.video_composer import VideoComposer
+
+def frame_paths(frames_dir: str) -> list:
+    paths = glob.glob(os.path.join(frames_dir, "frame_*.*"))
+    return sorted(paths, key=lambda p: int(re.search(r'frame_(\d+)', p).group(1)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--frames", default="output")
+    parser.add_argument("--audio", default=os.path.join("output", "final_voiceover.mp3"))
+    args = parser.parse_args()
+
+    images = frame_paths(args.frames)
+    if not images or not os.path.exists(args.audio):
+        print(f"Need frame_*.png and an audio file in {args.frames}")
+        return
+    print(f"{len(images)} frames, audio {args.audio}, {args.runs} run(s) per engine\n")
+
+    composer = VideoComposer()
+    renders = {
+        "moviepy": lambda audio, out: composer._compose_moviepy(audio, images, out),
+        "ffmpeg": lambda audio, out: composer.compose_stills(audio, images, out),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine, render in renders.items():
+            timings = []
+            output_path = os.path.join(tmp, f"{engine}.mp4")
+            try:
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    render(args.audio, output_path)
+                    timings.append(time.perf_counter() - start)
+            except Exception as e:
+                print(f"{engine:8} FAILED: {e}")
+                continue
+            size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            print(f"{engine:8} best {min(timings):6.1f}s  mean {sum(timings) / len(timings):6.1f}s  output {size_mb:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# "single" sends one truncated prompt (the original behaviour), "chunked" always
+# maps over chunks, "auto" only chunks papers too long for the single prompt.
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "auto")
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", "8000"))
+# Total input budget for the map phase; longer papers are sampled down to it
+ANALYSIS_TOKEN_BUDGET = int(os.getenv("ANALYSIS_TOKEN_BUDGET", "48000"))
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+SINGLE_PASS_CHARS = 100000
+
+# Rough average for Portuguese/English prose; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+REFERENCES_HEADING = re.compile(
+    r'^\s*(references|bibliography|referências|referências bibliográficas|bibliografia)\s*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def strip_references(text: str) -> str:
+    """Drops the trailing reference list, which costs tokens and carries no findings."""
+    matches = list(REFERENCES_HEADING.finditer(text))
+    # Only cut at a heading in the last part of the paper, never at an early "References" mention
+    if matches and matches[-1].start() > len(text) * 0.5:
+        return text[:matches[-1].start()]
+    return text
+
+def split_text(text: str, max_tokens: int = None) -> list:
+    """
+    Splits text into chunks of at most `max_tokens` (estimated), breaking on
+    paragraph boundaries where possible and on lines/characters otherwise.
+    """
+    max_chars = (max_tokens or ANALYSIS_CHUNK_TOKENS) * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for paragraph in re.split(r'\n\s*\n', text):
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces = [paragraph[i:i + max_chars] for i in range(0, len(paragraph), max_chars)]
+        for piece in pieces:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def plan_chunks(full_text: str, mode: str = None) -> list:
+    """
+    Returns the text pieces to analyse: one piece in single-pass mode (and in
+    auto mode for papers up to SINGLE_PASS_CHARS), or token-budgeted chunks
+    (at most ANALYSIS_TOKEN_BUDGET in total) otherwise.
+    """
+    mode = (mode or ANALYSIS_MODE).lower()
+    if mode == "single":
+        return [full_text[:SINGLE_PASS_CHARS]]
+
+    text = strip_references(full_text)
+    # Papers that fit the single prompt keep the two-call path; only longer ones were losing sections
+    if mode == "auto" and len(text) <= SINGLE_PASS_CHARS:
+        return [text]
+
+    chunks = split_text(text)
+    max_chunks = max(1, ANALYSIS_TOKEN_BUDGET // ANALYSIS_CHUNK_TOKENS)
+    if len(chunks) > max_chunks:
+        # Keep the first and last chunks (abstract/intro, discussion/conclusion) and sample evenly in between
+        step = (len(chunks) - 1) / (max_chunks - 1) if max_chunks > 1 else 0
+        picked = sorted({round(i * step) for i in range(max_chunks)})
+        logger.info(f"Paper has {len(chunks)} chunks, analysing {len(picked)} within the token budget")
+        chunks = [chunks[i] for i in picked]
+    return chunks
+
+async def map_chunks(chunks: list, summarize_chunk, concurrency: int = None) -> list:
+    """
+    Runs `summarize_chunk(index, total, chunk)` over all chunks with bounded
+    concurrency. Results keep chunk order; failed chunks yield None.
+    """
+    semaphore = asyncio.Semaphore(concurrency or ANALYSIS_CONCURRENCY)
+
+    async def run(index, chunk):
+        async with semaphore:
+            try:
+                return await summarize_chunk(index, len(chunks), chunk)
+            except Exception as e:
+                logger.error(f"Chunk {index + 1}/{len(chunks)} failed: {e}")
+                return None
+
+    return await asyncio.gather(*(run(i, c) for i, c in enumerate(chunks)))
+
+def join_notes(notes: list) -> str:
+    """Formats the map-phase notes as the input of the reduce prompt."""
+    parts = [f"[Parte {i + 1}/{len(notes)}]\n{note.strip()}" for i, note in enumerate(notes) if note]
+    return "\n\n".join(parts)
+
+async def prepare_source(full_text: str, summarize_chunk, agent_name: str) -> tuple:
+    """
+    The text an agent's report prompt is built from. Short papers go in whole;
+    long ones are summarized chunk by chunk (map) and the report is built from
+    those notes (reduce), within a fixed token budget.
+
+    Args:
+        full_text (str): The paper's extracted text.
+        summarize_chunk: The agent's `(index, total, chunk) -> notes` coroutine.
+        agent_name (str): Used in log messages.
+
+    Returns:
+        tuple: (source_label, source_text), or (None, error message) when there
+        is no text or every chunk failed.
+    """
+    chunks = [c for c in plan_chunks(full_text) if c.strip()]
+    if not chunks:
+        return None, "No text could be extracted from the PDF"
+    if len(chunks) == 1:
+        return "Input Text", chunks[0]
+
+    logger.info(f"{agent_name} over {len(chunks)} chunks...")
+    notes = await map_chunks(chunks, summarize_chunk)
+    if not any(notes):
+        return None, "All chunk analyses failed"
+    return "Notes taken while reading the article in parts", join_notes(notes)
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+import google.generativeai as genai
+import json
+from src.agents.gemini_client import generate, agent_timeout
+from src.agents.chunking import prepare_source
+from src.storage.blob_store import resolve
+
+logger = logging.getLogger(__name__)
+
+# "split" runs AcademicAgent and SocialAgent separately, "combined" sends the paper once
+ANALYSIS_STRATEGY = os.getenv("ANALYSIS_STRATEGY", "split")
+
+class CombinedAnalysisAgent:
+    """
+    Produces the academic_report and the social_report from a single prompt,
+    so the paper text is paid for once instead of twice. Both reports keep
+    the keys SynthesisAgent expects from AcademicAgent and SocialAgent.
+    """
+    MODEL_NAME = 'gemini-flash-latest'
+    # Bump when the prompt changes so cached results are not reused
+    PROMPT_VERSION = 1
+
+    def __init__(self, use_cache: bool = True):
+        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.timeout = agent_timeout("combined")
+        self.use_cache = use_cache
+
+    async def analyze(self, extracted_data: dict) -> tuple:
+        """
+        Analyzes the extracted PDF data for both the academic and the social angle.
+
+        Args:
+            extracted_data (dict): The JSON output from the PDF ingestion step.
+
+        Returns:
+            tuple: (academic_report, social_report) dicts.
+        """
+        logger.info("Starting Combined Analysis with Gemini...")
+
+        # full_text may be a blob reference when it comes from chat state
+        full_text = resolve(extracted_data.get("full_text", ""))
+        source_label, source_text = await prepare_source(full_text, self._summarize_chunk, "Combined Analysis")
+        if source_label is None:
+            error = {"error": source_text}
+            return error, error
+
+        prompt = f"""
+        You are both an expert academic researcher and a social media strategist for TikTok, Instagram Reels and YouTube Shorts in the **Brazilian market**.
+        Analyze the following research article text and produce two reports in a single JSON object.
+
+        {source_label}:
+        {source_text}
+
+        Your output JSON must have exactly two top-level keys (all values in **Portuguese (Brazil)**):
+
+        "academic_report": an object with
+        - "summary": A concise summary of the paper.
+        - "key_findings": List of main results or arguments.
+        - "methodology_details": {{
+            "sample_size": "Number of participants (e.g., 50 students)",
+            "duration": "Length of study (e.g., 12 weeks)",
+            "groups": "Description of control vs experimental groups",
+            "procedure": "Brief step-by-step of what happened"
+        }}
+        - "deeper_interpretation": A deep dive into the implications, going beyond the surface text.
+        - "limitations_and_debates": Potential weaknesses, missing angles, or areas of disagreement in the field.
+        - "contextual_relevance": How this fits into the broader history and future of this discipline.
+        - "controversies": Any inferred controversies or unresolved questions.
+        - "related_trajectories": Where this research might lead next.
+        The academic report must be objective, scholarly, and insightful.
+
+        "social_report": an object with
+        - "target_audience_pain_points": What frustrations or desires does this topic address for a general or teacher audience in Brazil?
+        - "viral_hooks": List of 3-5 strong opening lines (in Portuguese) that would grab attention immediately. Use Brazilian internet slang/style if appropriate but keep it respectful.
+        - "narrative_patterns": Suggested storytelling structures (e.g., "O Mistério," "O Mito Detonado," "O Passo a Passo").
+        - "visual_style_suggestions": Ideas for visuals that would work well (e.g., "tipografia rápida," "cenas de natureza," "animações de diagramas").
+        - "engagement_strategies": How to encourage comments or shares (e.g., "Pergunte se concordam," "Desafie uma crença comum").
+        - "trending_formats": Inferred video formats that match this content (e.g., "Tela verde comentada," "Lista," "Storytime").
+        The social report should focus on "Edutainment" - educational but highly entertaining and digestible for Brazilians.
+
+        Output ONLY valid JSON.
+        """
+
+        try:
+            text = await generate(
+                self.model,
+                prompt,
+                generation_config={"response_mime_type": "application/json"},
+                timeout=self.timeout,
+                use_cache=self.use_cache
+            )
+
+            reports = json.loads(text)
+            academic_report = reports.get("academic_report") or {"error": "Missing academic_report"}
+            social_report = reports.get("social_report") or {"error": "Missing social_report"}
+            logger.info("Combined Analysis complete.")
+            return academic_report, social_report
+
+        except asyncio.TimeoutError:
+            logger.error(f"CombinedAnalysisAgent timed out after {self.timeout}s")
+            error = {"error": f"Timed out after {self.timeout}s"}
+            return error, error
+
+        except Exception as e:
+            logger.error(f"Error in CombinedAnalysisAgent: {e}")
+            error = {"error": str(e)}
+            return error, error
+
+    async def _summarize_chunk(self, index: int, total: int, chunk: str) -> str:
+        """Map step: plain-text notes covering both the research content and its short-video potential."""
+        prompt = f"""
+        You are an expert academic researcher and social media strategist reading part {index + 1} of {total} of a research article.
+        Take concise notes (in **Portuguese (Brazil)**) on whatever this part contains: research question,
+        methodology (sample size, duration, groups, procedure), results with their numbers, limitations,
+        and anything that could become short-video content (surprising facts, relatable problems, myths it challenges).
+        Skip topics that do not appear in this part.
+        Keep it under 350 words. Output plain text notes only.
+
+        Article Part:
+        {chunk}
+        """
+        return await generate(self.model, prompt, timeout=self.timeout, use_cache=self.use_cache)
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import os
+from src.storage.disk_cache import DiskCache
+from src.jobs.metrics import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_TIMEOUT = float(os.getenv("AGENT_TIMEOUT", "180"))
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+# Responses are keyed by model, generation config and prompt; TTL 0 keeps them until evicted
+llm_cache = DiskCache(
+    "llm",
+    max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "0")) or None
+)
+
+def agent_timeout(agent_name: str) -> float:
+    """Per-agent timeout in seconds, e.g. AGENT_TIMEOUT_ACADEMIC=90 (falls back to AGENT_TIMEOUT)."""
+    return float(os.getenv(f"AGENT_TIMEOUT_{agent_name.upper()}", DEFAULT_AGENT_TIMEOUT))
+
+def _cache_key(model, prompt: str, generation_config: dict) -> str:
+    model_name = getattr(model, "model_name", str(model))
+    return DiskCache.make_key("gemini", model_name, generation_config or {}, DiskCache.make_key(prompt))
+
+def _is_cacheable(text: str, generation_config: dict) -> bool:
+    # Never cache a JSON response that would fail to parse again on every rerun
+    if (generation_config or {}).get("response_mime_type") == "application/json":
+        try:
+            json.loads(text)
+        except ValueError:
+            return False
+    return bool(text)
+
+async def generate(model, prompt: str, generation_config: dict = None, timeout: float = None, use_cache: bool = True) -> str:
+    """
+    Runs a Gemini generation without blocking the event loop.
+
+    Identical requests (same model, generation config and prompt) are served
+    from the on-disk LLM cache.
+
+    Args:
+        model: A `genai.GenerativeModel`.
+        prompt (str): The prompt.
+        generation_config (dict): Optional generation config.
+        timeout (float): Seconds before the call is abandoned (asyncio.TimeoutError).
+        use_cache (bool): Set to False to ignore a cached response; the fresh
+            response still replaces it.
+
+    Returns:
+        str: The response text.
+    """
+    key = _cache_key(model, prompt, generation_config) if LLM_CACHE_ENABLED else None
+    if key and use_cache:
+        cached = await asyncio.to_thread(llm_cache.get_bytes, key)
+        if cached is not None:
+            logger.info(f"LLM cache hit ({llm_cache.hits} hits / {llm_cache.misses} misses)")
+            record_llm_usage(cached=True)
+            return cached.decode('utf-8')
+
+    response = await asyncio.wait_for(
+        model.generate_content_async(prompt, generation_config=generation_config),
+        timeout or DEFAULT_AGENT_TIMEOUT
+    )
+    text = response.text
+    usage = getattr(response, "usage_metadata", None)
+    record_llm_usage(
+        prompt_tokens=getattr(usage, "prompt_token_count", 0),
+        output_tokens=getattr(usage, "candidates_token_count", 0)
+    )
+
+    if key and _is_cacheable(text, generation_config):
+        await asyncio.to_thread(llm_cache.put_bytes, key, text.encode('utf-8'))
+    return text
+
+async def generate_stream(model, prompt: str, generation_config: dict = None, timeout: float = None, use_cache: bool = True):
+    """
+    Streaming variant of `generate`: yields text chunks as Gemini produces them.
+
+    A cached response is yielded as a single chunk. The full text is cached
+    once the stream completes. `timeout` bounds the whole stream.
+    """
+    key = _cache_key(model, prompt, generation_config) if LLM_CACHE_ENABLED else None
+    if key and use_cache:
+        cached = await asyncio.to_thread(llm_cache.get_bytes, key)
+        if cached is not None:
+            record_llm_usage(cached=True)
+            yield cached.decode('utf-8')
+            return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (timeout or DEFAULT_AGENT_TIMEOUT)
+    response = await asyncio.wait_for(
+        model.generate_content_async(prompt, generation_config=generation_config, stream=True),
+        deadline - loop.time()
+    )
+
+    parts = []
+    chunks = response.__aiter__()
+    while True:
+        try:
+            chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, deadline - loop.time()))
+        except StopAsyncIteration:
+            break
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+
+    usage = getattr(response, "usage_metadata", None)
+    record_llm_usage(
+        prompt_tokens=getattr(usage, "prompt_token_count", 0),
+        output_tokens=getattr(usage, "candidates_token_count", 0)
+    )
+    text = "".join(parts)
+    if key and _is_cacheable(text, generation_config):
+        await asyncio.to_thread(llm_cache.put_bytes, key, text.encode('utf-8'))
+
+def cache_stats() -> dict:
+    """Hit/miss counters and size of the LLM cache."""
+    return llm_cache.stats()
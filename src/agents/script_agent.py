@@ -1,21 +1,37 @@
+import asyncio
 import logging
 import os
 import google.generativeai as genai
 import json
+from src.agents.gemini_client import generate, generate_stream, agent_timeout
+from src.script.segments import Script, diff_segments
+
+# "segments" revises only the blocks the feedback touches, "full" rewrites the whole script
+SCRIPT_REVISION_MODE = os.getenv("SCRIPT_REVISION_MODE", "segments")
+# Above this share of affected blocks a full rewrite is cheaper and more coherent
+FULL_REVISION_THRESHOLD = 0.6
 
 logger = logging.getLogger(__name__)
 
 class ScriptAgent:
-    def __init__(self):
+    MODEL_NAME = 'gemini-flash-latest'
+    # Bump when the prompt changes so cached results are not reused
+    PROMPT_VERSION = 1
+
+    def __init__(self, use_cache: bool = True):
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-flash-latest')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.timeout = agent_timeout("script")
+        self.use_cache = use_cache
 
-    async def generate_script(self, knowledge_base: dict) -> str:
+    async def generate_script(self, knowledge_base: dict, on_progress=None) -> str:
         """
         Generates a video script based on the unified knowledge base.
         
         Args:
             knowledge_base (dict): The output from SynthesisAgent.
+            on_progress: Optional coroutine function called with the text generated
+                so far; when given, the response is streamed.
             
         Returns:
             str: The generated script text.
@@ -53,11 +69,20 @@ class ScriptAgent:
         """
 
         try:
-            response = self.model.generate_content(prompt)
-            script = response.text
+            if on_progress is None:
+                script = await generate(self.model, prompt, timeout=self.timeout, use_cache=self.use_cache)
+            else:
+                script = ""
+                async for chunk in generate_stream(self.model, prompt, timeout=self.timeout, use_cache=self.use_cache):
+                    script += chunk
+                    await on_progress(script)
             logger.info("Script generation complete.")
             return script
 
+        except asyncio.TimeoutError:
+            logger.error(f"ScriptAgent timed out after {self.timeout}s")
+            return f"Error generating script: timed out after {self.timeout}s"
+
         except Exception as e:
             logger.error(f"Error in ScriptAgent: {e}")
             return f"Error generating script: {str(e)}"
@@ -83,9 +108,137 @@ class ScriptAgent:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return await generate(self.model, prompt, timeout=self.timeout, use_cache=self.use_cache)
             
+        except asyncio.TimeoutError:
+            logger.error(f"Script revision timed out after {self.timeout}s")
+            return f"Error revising script: timed out after {self.timeout}s"
+
         except Exception as e:
             logger.error(f"Error revising script: {e}")
             return f"Error revising script: {str(e)}"
+
+    async def revise_segments(self, script: Script, user_feedback: str, markdown: str = None) -> tuple:
+        """
+        Revises only the script blocks (Tempo/Visual/Texto) that the feedback affects.
+        
+        First a short prompt with a one-line outline of each block picks the
+        affected blocks; then only those blocks, plus the narration of their
+        neighbours as context, are sent for rewriting. Falls back to
+        `revise_script` when the script has no timed blocks or most blocks change.
+        
+        Args:
+            script (Script): The current script, as stored after parsing.
+            user_feedback (str): The user's requested changes.
+            markdown (str): The stored script text, sent as-is for a full rewrite (rendered from `script` if omitted).
+        
+        Returns:
+            tuple: (revised Script, diff) where diff is the per-segment list from
+            `diff_segments`, or None after a full rewrite.
+        """
+        segments = script.segments
+        current_script = markdown or script.to_markdown()
+        if SCRIPT_REVISION_MODE != "segments" or not any(s.tempo for s in segments):
+            return await self._revise_whole(current_script, user_feedback), None
+        
+        logger.info("Revising Script segments with Gemini...")
+        try:
+            indices = await self._select_segments(segments, user_feedback)
+            if indices is None or len(indices) > len(segments) * FULL_REVISION_THRESHOLD:
+                logger.info("Feedback affects most of the script, revising it whole.")
+                return await self._revise_whole(current_script, user_feedback), None
+            
+            revised = await self._rewrite_segments(segments, indices, user_feedback)
+            
+        except Exception as e:
+            logger.error(f"Segment revision failed, revising whole script: {e}")
+            return await self._revise_whole(current_script, user_feedback), None
+        
+        new_script = script.copy()
+        for index, block in revised.items():
+            segment = new_script.segments[index]
+            if block.get("visual"):
+                segment.set("visual", block["visual"])
+            if block.get("texto"):
+                segment.set("narration", block["texto"])
+        
+        diff = diff_segments(segments, new_script.segments)
+        return new_script, diff
+
+    async def _revise_whole(self, current_script: str, user_feedback: str) -> Script:
+        # A rewritten script is new text, so this is the one place it has to be parsed
+        return Script.parse(await self.revise_script(current_script, user_feedback))
+
+    async def _select_segments(self, segments: list, user_feedback: str):
+        """Returns the indices of the blocks the feedback refers to, or None if it applies to the whole script."""
+        outline = "\n".join(
+            f"{i}. [{s.tempo}] {s.narration[:80]} | Visual: {s.visual[:50]}"
+            for i, s in enumerate(segments)
+        )
+        prompt = f"""
+        A short video script is split into numbered blocks:
+        {outline}
+        
+        User Feedback:
+        "{user_feedback}"
+        
+        Which blocks must change to apply this feedback?
+        Output JSON: {{"scope": "segments" or "whole_script", "indices": [block numbers]}}.
+        Use "whole_script" only if the feedback changes the entire script (tone, language, length, structure).
+        """
+        text = await generate(
+            self.model,
+            prompt,
+            generation_config={"response_mime_type": "application/json"},
+            timeout=self.timeout,
+            use_cache=self.use_cache
+        )
+        selection = json.loads(text)
+        if selection.get("scope") == "whole_script":
+            return None
+        return sorted({int(i) for i in selection.get("indices", []) if 0 <= int(i) < len(segments)})
+
+    async def _rewrite_segments(self, segments: list, indices: list, user_feedback: str) -> dict:
+        """Rewrites the selected blocks; returns {index: {"visual", "texto"}}."""
+        if not indices:
+            return {}
+        
+        blocks = []
+        for i in indices:
+            before = segments[i - 1].narration if i > 0 else ""
+            after = segments[i + 1].narration if i + 1 < len(segments) else ""
+            blocks.append({
+                "index": i,
+                "tempo": segments[i].tempo,
+                "visual": segments[i].visual,
+                "texto": segments[i].narration,
+                "previous_line": before,
+                "next_line": after,
+            })
+        
+        prompt = f"""
+        Revise these blocks of a 60-second vertical video script based on the user's feedback.
+        
+        Blocks (with the narration right before and after each one, for continuity only):
+        {json.dumps(blocks, ensure_ascii=False, indent=2)}
+        
+        User Feedback:
+        "{user_feedback}"
+        
+        **Language: Portuguese (Brazil)**.
+        Keep each block's duration: the narration must still fit its "tempo".
+        Output JSON: {{"blocks": [{{"index": number, "visual": "...", "texto": "..."}}]}} with one entry per block above.
+        """
+        text = await generate(
+            self.model,
+            prompt,
+            generation_config={"response_mime_type": "application/json"},
+            timeout=self.timeout,
+            use_cache=self.use_cache
+        )
+        result = json.loads(text)
+        return {
+            int(block["index"]): block
+            for block in result.get("blocks", [])
+            if int(block.get("index", -1)) in indices
+        }
@@ -1,14 +1,24 @@
+import asyncio
 import logging
 import os
 import google.generativeai as genai
 import json
+from src.agents.gemini_client import generate, agent_timeout
+from src.agents.chunking import prepare_source
+from src.storage.blob_store import resolve
 
 logger = logging.getLogger(__name__)
 
 class SocialAgent:
-    def __init__(self):
+    MODEL_NAME = 'gemini-flash-latest'
+    # Bump when the prompt changes so cached results are not reused
+    PROMPT_VERSION = 1
+
+    def __init__(self, use_cache: bool = True):
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-flash-latest')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.timeout = agent_timeout("social")
+        self.use_cache = use_cache
 
     async def analyze(self, extracted_data: dict) -> dict:
         """
@@ -22,15 +32,18 @@ class SocialAgent:
         """
         logger.info("Starting Social Analysis with Gemini...")
         
-        full_text = extracted_data.get("full_text", "")
-        truncated_text = full_text[:100000]
+        # full_text may be a blob reference when it comes from chat state
+        full_text = resolve(extracted_data.get("full_text", ""))
+        source_label, source_text = await prepare_source(full_text, self._summarize_chunk, "Social Analysis")
+        if source_label is None:
+            return {"error": source_text}
 
         prompt = f"""
         You are an expert social media strategist and content creator for platforms like TikTok, Instagram Reels, and YouTube Shorts, specifically for the **Brazilian market**.
         Analyze the following research article text and produce a 'social_report' in JSON format.
         
-        Input Text:
-        {truncated_text}
+        {source_label}:
+        {source_text}
         
         Your output JSON must have the following keys (values must be in **Portuguese (Brazil)**):
         - "target_audience_pain_points": What frustrations or desires does this topic address for a general or teacher audience in Brazil?
@@ -45,15 +58,36 @@ class SocialAgent:
         """
 
         try:
-            response = self.model.generate_content(
+            text = await generate(
+                self.model,
                 prompt,
-                generation_config={"response_mime_type": "application/json"}
+                generation_config={"response_mime_type": "application/json"},
+                timeout=self.timeout,
+                use_cache=self.use_cache
             )
             
-            report = json.loads(response.text)
+            report = json.loads(text)
             logger.info("Social Analysis complete.")
             return report
 
+        except asyncio.TimeoutError:
+            logger.error(f"SocialAgent timed out after {self.timeout}s")
+            return {"error": f"Timed out after {self.timeout}s"}
+
         except Exception as e:
             logger.error(f"Error in SocialAgent: {e}")
             return {"error": str(e)}
+
+    async def _summarize_chunk(self, index: int, total: int, chunk: str) -> str:
+        """Map step: plain-text notes on the social-media potential of one part of the article."""
+        prompt = f"""
+        You are a social media strategist for the **Brazilian market** reading part {index + 1} of {total} of a research article.
+        Take concise notes (in **Portuguese (Brazil)**) on what in this part could become short-video content:
+        surprising facts and numbers, relatable problems, concrete examples, myths it challenges, visual ideas.
+        Skip anything that does not appear in this part.
+        Keep it under 200 words. Output plain text notes only.
+        
+        Article Part:
+        {chunk}
+        """
+        return await generate(self.model, prompt, timeout=self.timeout, use_cache=self.use_cache)
@@ -1,14 +1,22 @@
+import asyncio
 import logging
 import os
 import google.generativeai as genai
 import json
+from src.agents.gemini_client import generate, agent_timeout
 
 logger = logging.getLogger(__name__)
 
 class SynthesisAgent:
-    def __init__(self):
+    MODEL_NAME = 'gemini-flash-latest'
+    # Bump when the prompt changes so cached results are not reused
+    PROMPT_VERSION = 1
+
+    def __init__(self, use_cache: bool = True):
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-flash-latest')
+        self.model = genai.GenerativeModel(self.MODEL_NAME)
+        self.timeout = agent_timeout("synthesis")
+        self.use_cache = use_cache
 
     async def synthesize(self, academic_report: dict, social_report: dict) -> dict:
         """
@@ -48,15 +56,22 @@ class SynthesisAgent:
         """
 
         try:
-            response = self.model.generate_content(
+            text = await generate(
+                self.model,
                 prompt,
-                generation_config={"response_mime_type": "application/json"}
+                generation_config={"response_mime_type": "application/json"},
+                timeout=self.timeout,
+                use_cache=self.use_cache
             )
             
-            knowledge_base = json.loads(response.text)
+            knowledge_base = json.loads(text)
             logger.info("Synthesis complete.")
             return knowledge_base
 
+        except asyncio.TimeoutError:
+            logger.error(f"SynthesisAgent timed out after {self.timeout}s")
+            return {"error": f"Timed out after {self.timeout}s"}
+
         except Exception as e:
             logger.error(f"Error in SynthesisAgent: {e}")
             return {"error": str(e)}
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+from telebot import asyncio_helper
+from src.bot.bot_instance import bot
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Telegram's Bot API refuses downloads above 20 MB anyway
+MAX_DOWNLOAD_BYTES = int(float(os.getenv("MAX_DOWNLOAD_MB", "20")) * 1024 * 1024)
+
+class FileTooLargeError(Exception):
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"File is {size / 1024 / 1024:.1f} MB, the limit is {limit / 1024 / 1024:.0f} MB")
+        self.size = size
+        self.limit = limit
+
+def check_file_size(file_size, max_bytes: int = None):
+    """Raises FileTooLargeError when Telegram reports a size above the limit."""
+    limit = max_bytes or MAX_DOWNLOAD_BYTES
+    if file_size and file_size > limit:
+        raise FileTooLargeError(file_size, limit)
+
+def _file_url(file_path: str) -> str:
+    # Same URL resolution as telebot's own download_file
+    if asyncio_helper.FILE_URL is None:
+        return f"https://api.telegram.org/file/bot{bot.token}/{file_path}"
+    return asyncio_helper.FILE_URL.format(bot.token, file_path)
+
+async def stream_download(file_id: str, dest_dir: str, name: str = None, suffix: str = "", max_bytes: int = None):
+    """
+    Streams a Telegram file to disk in chunks, hashing it on the way.
+
+    The size limit is checked against Telegram's reported size before the
+    transfer starts and again while reading, so an oversized file is
+    rejected without being fully downloaded.
+
+    Args:
+        file_id (str): Telegram file_id.
+        dest_dir (str): Directory to write into (e.g. a job workspace).
+        name (str): Final file name. Defaults to `<sha256><suffix>`, which
+            makes the directory content-addressed.
+        suffix (str): Extension used for content-addressed names.
+        max_bytes (int): Size limit (defaults to MAX_DOWNLOAD_MB).
+
+    Returns:
+        tuple: (path, sha256 hex digest, size in bytes)
+    """
+    limit = max_bytes or MAX_DOWNLOAD_BYTES
+    file_info = await bot.get_file(file_id)
+    check_file_size(file_info.file_size, limit)
+
+    os.makedirs(dest_dir, exist_ok=True)
+    tmp_path = os.path.join(dest_dir, f".download-{file_id[-16:]}.tmp")
+    hasher = hashlib.sha256()
+    size = 0
+
+    session = await asyncio_helper.session_manager.get_session()
+    try:
+        async with session.get(_file_url(file_info.file_path), proxy=asyncio_helper.proxy) as response:
+            if response.status != 200:
+                raise asyncio_helper.ApiHTTPException('Download file', response)
+            check_file_size(response.content_length, limit)
+
+            with open(tmp_path, 'wb') as out:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > limit:
+                        raise FileTooLargeError(size, limit)
+                    hasher.update(chunk)
+                    out.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    digest = hasher.hexdigest()
+    path = os.path.join(dest_dir, name or f"{digest}{suffix}")
+    if name is None and os.path.exists(path):
+        # Same content already stored
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    logger.info(f"Downloaded {size} bytes to {path}")
+    return path, digest, size
@@ -4,6 +4,14 @@ import asyncio
 from telebot.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from src.bot.bot_instance import bot
 from src.bot.states import BotState
+from src.jobs.job_manager import job_manager, JobStatus
+from src.jobs.workspace import JobWorkspace
+from src.jobs.metrics import PipelineMetrics
+from src.storage.blob_store import offload, resolve
+from src.storage.disk_cache import DiskCache
+from src.script.segments import Script
+from src.bot.live_message import LiveMessage
+from src.bot.downloads import stream_download, check_file_size, FileTooLargeError
 
 # Configure logging
 logging.basicConfig(
@@ -12,60 +20,95 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-import json
+import atexit
+from src.bot.state_store import StateStore, create_state_backend
 
-# Persistence file
-STATE_FILE = "bot_state.json"
+# Keep each job's scratch files (frames etc.) after its artifacts are promoted
+KEEP_WORKSPACES = os.getenv("JOB_KEEP_WORKSPACES", "0") == "1"
 
-def load_persistence():
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, 'r') as f:
-                data = json.load(f)
-                # Convert state strings back to Enum if needed, or just handle as strings/ints
-                # For simplicity, we'll store states as integers (values of the Enum)
-                return data.get('states', {}), data.get('data', {})
-        except Exception as e:
-            logger.error(f"Failed to load state: {e}")
-    return {}, {}
+# Analysis results keyed by document hash + agent versions (identical uploads skip the LLM stages)
+pipeline_cache = DiskCache(
+    "pipeline",
+    max_entries=int(os.getenv("PIPELINE_CACHE_MAX_ENTRIES", "500")),
+    ttl=float(os.getenv("PIPELINE_CACHE_TTL", str(30 * 24 * 3600)))
+)
 
-def save_persistence():
-    try:
-        data = {
-            'states': user_states,
-            'data': user_data
-        }
-        with open(STATE_FILE, 'w') as f:
-            json.dump(data, f)
-    except Exception as e:
-        logger.error(f"Failed to save state: {e}")
+# Stream the script into a live-edited message instead of waiting for the whole response
+STREAM_SCRIPT = os.getenv("STREAM_SCRIPT", "1") == "1"
 
-# Load initial state
-user_states, user_data = load_persistence()
+# Send a low-resolution draft for approval before the full-quality render
+VIDEO_PREVIEW = os.getenv("VIDEO_PREVIEW", "1") == "1"
 
-# Helper to convert state enum to int for storage if needed, 
-# but python dicts can handle keys as strings (chat_id is int, but json converts keys to string)
-# We need to handle chat_id conversion (JSON keys are always strings)
+# Start narration and images in the background while the user reviews the script
+SPECULATIVE_RENDER = os.getenv("SPECULATIVE_RENDER", "0") == "1"
+# Speculative runs allowed per chat in a rolling 24h window (each one costs TTS + image generation)
+SPECULATIVE_DAILY_RUNS = int(os.getenv("SPECULATIVE_DAILY_RUNS", "3"))
+
+# Per-chat state lives in a pluggable backend (SQLite by default) and is loaded lazily
+state_store = StateStore(create_state_backend(), BotState, BotState.WAITING_FOR_PDF)
+atexit.register(state_store.close)
 
 def get_state(chat_id):
-    # JSON keys are strings, so we might need to cast chat_id to string to lookup
-    state_val = user_states.get(str(chat_id))
-    if state_val is None:
-        return BotState.WAITING_FOR_PDF
-    return state_val
+    return state_store.get_state(chat_id)
 
 def set_state(chat_id, state):
-    user_states[str(chat_id)] = state
-    save_persistence()
+    state_store.set_state(chat_id, state)
 
 def get_data(chat_id):
-    if str(chat_id) not in user_data:
-        user_data[str(chat_id)] = {}
-    return user_data[str(chat_id)]
+    return state_store.get_data(chat_id)
 
 def save_data(chat_id):
     # Call this after modifying user_data[chat_id]
-    save_persistence()
+    state_store.mark_dirty(chat_id)
+
+def put_large(chat_id, key, value):
+    """Stores a possibly large value in chat data, offloading it to the blob store."""
+    get_data(chat_id)[key] = offload(value)
+    save_data(chat_id)
+
+def get_large(chat_id, key, default=None):
+    """Reads a value stored with put_large, loading it from the blob store on demand."""
+    return resolve(get_data(chat_id).get(key, default))
+
+def store_script(chat_id, script) -> str:
+    """
+    Stores a new script version with its segments for every later stage. A markdown
+    str is parsed here; a Script (e.g. from a segment revision) is stored as is.
+    Returns the markdown.
+    """
+    import hashlib
+    if isinstance(script, Script):
+        markdown = script.to_markdown()
+    else:
+        markdown, script = script, Script.parse(script)
+    put_large(chat_id, 'current_script', markdown)
+    put_large(chat_id, 'script_model', script.to_dict())
+    get_data(chat_id)['script_hash'] = hashlib.sha256(markdown.encode('utf-8')).hexdigest()
+    save_data(chat_id)
+    return markdown
+
+def load_script(chat_id) -> Script:
+    """The chat's current script as a Script (parsed on the fly for chats stored before it existed)."""
+    model = get_large(chat_id, 'script_model')
+    if model is not None:
+        return Script.from_dict(model)
+    return Script.parse(get_large(chat_id, 'current_script', ""))
+
+def enqueue_job(chat_id, kind, job_fn, lane="default"):
+    """Submits background work for a chat and records its job ID in the chat's data."""
+    job = job_manager.submit(chat_id, kind, job_fn, lane=lane)
+    data = get_data(chat_id)
+    job_ids = data.setdefault('job_ids', [])
+    job_ids.append(job.id)
+    del job_ids[:-job_manager.max_jobs_per_chat]
+    data['active_job_id'] = job.id
+    save_data(chat_id)
+    return job
+
+async def report_progress(job, chat_id, text, **kwargs):
+    """Updates the job's progress line and relays it to the chat."""
+    job.progress = text
+    return await bot.send_message(chat_id, text, **kwargs)
 
 @bot.message_handler(commands=['start'])
 async def start(message: Message):
@@ -77,6 +120,22 @@ async def start(message: Message):
     )
     set_state(chat_id, BotState.WAITING_FOR_PDF)
 
+@bot.message_handler(commands=['status'])
+async def status(message: Message):
+    """Report the chat's background jobs."""
+    jobs = job_manager.jobs_for_chat(message.chat.id)
+    if not jobs:
+        await bot.reply_to(message, "No jobs yet. Send me a PDF to get started.")
+        return
+    from src.agents.gemini_client import cache_stats
+    from src.media.image_generator import image_cache
+    lines = [job.describe() for job in jobs]
+    llm = cache_stats()
+    lines.append(f"LLM cache: {llm['hits']} hits / {llm['misses']} misses")
+    images = image_cache.stats()
+    lines.append(f"Image cache: {images['hits']} hits / {images['misses']} misses, {images['bytes'] // (1024 * 1024)} MB")
+    await bot.reply_to(message, "Your jobs:\n" + "\n".join(lines))
+
 @bot.message_handler(content_types=['document'])
 async def handle_pdf(message: Message):
     """Handle the PDF upload."""
@@ -87,30 +146,81 @@ async def handle_pdf(message: Message):
         await bot.reply_to(message, "Please send a valid PDF file.")
         return
 
-    file_info = await bot.get_file(document.file_id)
-    downloaded_file = await bot.download_file(file_info.file_path)
-    
-    # Create a temporary directory for downloads if it doesn't exist
-    download_dir = "downloads"
-    os.makedirs(download_dir, exist_ok=True)
-    
-    pdf_path = os.path.join(download_dir, f"{document.file_id}.pdf")
-    with open(pdf_path, 'wb') as new_file:
-        new_file.write(downloaded_file)
-    
-    await bot.reply_to(message, f"Downloaded {document.file_name}. Extracting text...")
+    try:
+        check_file_size(document.file_size)
+    except FileTooLargeError as e:
+        await bot.reply_to(message, f"This PDF is too large. {e}.")
+        return
+
+    job = enqueue_job(chat_id, "pdf", lambda job: run_pdf_pipeline(job, message))
+    await bot.reply_to(message, f"Received {document.file_name}. Queued as job {job.id} (see /status).")
+
+def pipeline_cache_key(pdf_sha256: str) -> str:
+    """Cache key for the analysis pipeline: document content, every agent's model and prompt version, and the analysis mode."""
+    from src.agents.academic_agent import AcademicAgent
+    from src.agents.social_agent import SocialAgent
+    from src.agents.synthesis_agent import SynthesisAgent
+    from src.agents.script_agent import ScriptAgent
+    from src.agents.combined_agent import CombinedAnalysisAgent, ANALYSIS_STRATEGY
+    from src.agents import chunking
+    agents = [(a.__name__, a.MODEL_NAME, a.PROMPT_VERSION)
+              for a in (AcademicAgent, SocialAgent, CombinedAnalysisAgent, SynthesisAgent, ScriptAgent)]
+    analysis = (ANALYSIS_STRATEGY, chunking.ANALYSIS_MODE, chunking.ANALYSIS_CHUNK_TOKENS, chunking.ANALYSIS_TOKEN_BUDGET)
+    return DiskCache.make_key("pdf-pipeline", pdf_sha256, agents, analysis)
+
+async def run_pdf_pipeline(job, message: Message, force: bool = False):
+    """Download, extraction, analysis and script generation for one uploaded PDF (runs as a background job)."""
+    chat_id = message.chat.id
+    document = message.document
+    # Anything pre-rendered for the previous script is now stale
+    cancel_speculative_render(chat_id)
+    discard_render(chat_id)
+    data = get_data(chat_id)
     
     try:
+        if force and data.get('pdf_path'):
+            # Regeneration of the chat's current document: no new download needed
+            pdf_path, pdf_sha256 = data['pdf_path'], data['pdf_sha256']
+        else:
+            job.progress = "Downloading"
+            workspace = JobWorkspace(chat_id, job.id)
+            try:
+                upload_path, pdf_sha256, _ = await stream_download(document.file_id, workspace.dir, name="upload.pdf")
+                # Uploads are stored by content hash, so identical files share one copy
+                os.makedirs("downloads", exist_ok=True)
+                pdf_path = os.path.join("downloads", f"{pdf_sha256}.pdf")
+                if not os.path.exists(pdf_path):
+                    os.replace(upload_path, pdf_path)
+            finally:
+                workspace.cleanup()
+            data['pdf_path'], data['pdf_sha256'] = pdf_path, pdf_sha256
+            save_data(chat_id)
+        
+        # Identical document already analysed with the same agents: skip straight to review
+        cache_key = pipeline_cache_key(pdf_sha256)
+        cached = None if force else await job_manager.run_in_thread(pipeline_cache.get_json, cache_key)
+        if cached:
+            logger.info(f"Pipeline cache hit for {pdf_sha256[:12]}")
+            data['pdf_extracted'] = cached['pdf_extracted']
+            put_large(chat_id, 'knowledge_base', cached['knowledge_base'])
+            store_script(chat_id, cached['script'])
+            await report_progress(job, chat_id, "♻️ This document was already analysed. Reusing the previous result.")
+            await send_script_for_review(chat_id, cached['knowledge_base'], cached['script'], offer_regenerate=True)
+            return
+        
+        file_name = document.file_name if document else os.path.basename(pdf_path)
+        await report_progress(job, chat_id, f"Extracting text from {file_name}...")
+        
         from src.ingestion.pdf_processor import extract_text_from_pdf
-        # Note: extract_text_from_pdf is synchronous, might block loop slightly but okay for now
-        extracted_data = extract_text_from_pdf(pdf_path)
+        # PDF parsing is CPU-bound, so it runs in the process pool
+        extracted_data = await job_manager.run_in_process(extract_text_from_pdf, pdf_path)
         
-        # Store extracted data
-        data = get_data(chat_id)
+        # Store extracted data; the full text goes to the blob store and agents load it on demand
+        extracted_data['full_text'] = await job_manager.run_in_thread(offload, extracted_data['full_text'])
         data['pdf_extracted'] = extracted_data
         save_data(chat_id)
         
-        await bot.send_message(chat_id,
+        await report_progress(job, chat_id,
             f"Extraction complete!\n"
             f"Title: {extracted_data.get('title')}\n"
             f"Pages: {extracted_data.get('page_count')}\n"
@@ -124,70 +234,131 @@ async def handle_pdf(message: Message):
         from src.agents.social_agent import SocialAgent
         from src.agents.synthesis_agent import SynthesisAgent
         from src.agents.script_agent import ScriptAgent
+        from src.agents import chunking, combined_agent
+        from src.agents.combined_agent import CombinedAnalysisAgent
+        
+        # Latency and token usage per stage, so the analysis strategies can be compared
+        metrics = PipelineMetrics(
+            job_id=job.id,
+            pdf_sha256=pdf_sha256,
+            strategy=combined_agent.ANALYSIS_STRATEGY,
+            analysis_mode=chunking.ANALYSIS_MODE
+        )
+        job.progress = "Analysing"
 
-        # 1. Academic Analysis
-        academic_agent = AcademicAgent()
-        academic_report = await academic_agent.analyze(extracted_data)
-        await bot.send_message(chat_id, "✅ Academic analysis complete.")
+        if combined_agent.ANALYSIS_STRATEGY == "combined":
+            # 1 + 2. One prompt produces both reports, so the paper text is sent once
+            with metrics.stage("analysis"):
+                academic_report, social_report = await CombinedAnalysisAgent(use_cache=not force).analyze(extracted_data)
+            await report_progress(job, chat_id, "✅ Academic and social media analysis complete.")
+        else:
+            # 1 + 2. Academic and Social Analysis are independent, so they run concurrently
+            async def run_analysis(agent, stage, done_text):
+                with metrics.stage(stage):
+                    report = await agent.analyze(extracted_data)
+                await report_progress(job, chat_id, done_text)
+                return report
 
-        # 2. Social Analysis
-        social_agent = SocialAgent()
-        social_report = await social_agent.analyze(extracted_data)
-        await bot.send_message(chat_id, "✅ Social media trends analysis complete.")
+            academic_report, social_report = await asyncio.gather(
+                run_analysis(AcademicAgent(use_cache=not force), "academic", "✅ Academic analysis complete."),
+                run_analysis(SocialAgent(use_cache=not force), "social", "✅ Social media trends analysis complete.")
+            )
 
         # 3. Synthesis
-        synthesis_agent = SynthesisAgent()
-        knowledge_base = await synthesis_agent.synthesize(academic_report, social_report)
-        data['knowledge_base'] = knowledge_base
-        save_data(chat_id)
+        synthesis_agent = SynthesisAgent(use_cache=not force)
+        with metrics.stage("synthesis"):
+            knowledge_base = await synthesis_agent.synthesize(academic_report, social_report)
+        put_large(chat_id, 'knowledge_base', knowledge_base)
+        job.progress = "Writing script"
         
         # 4. Script Generation
-        script_agent = ScriptAgent()
-        script = await script_agent.generate_script(knowledge_base)
-        data['current_script'] = script
+        script_agent = ScriptAgent(use_cache=not force)
+        with metrics.stage("script"):
+            if STREAM_SCRIPT:
+                # Show the script segment by segment while it is being written
+                live = LiveMessage(chat_id, header="✍️ Writing script...\n\n")
+                await live.start("")
+                
+                async def show_progress(partial):
+                    # Only complete blocks, so half-written lines don't flicker
+                    await live.update(partial[:partial.rfind("\n\n")] if "\n\n" in partial else "")
+                
+                script = await script_agent.generate_script(knowledge_base, on_progress=show_progress)
+                live.header = ""
+                if script.startswith("Error generating script"):
+                    await live.finish("❌ Script generation failed. See the details below.")
+                else:
+                    await live.finish("✅ Script written. Review it below.")
+            else:
+                script = await script_agent.generate_script(knowledge_base)
+        store_script(chat_id, script)
+        
+        logger.info(f"Pipeline metrics for job {job.id}:\n{metrics.summary()}")
+        data['last_pipeline_metrics'] = metrics.to_dict()
         save_data(chat_id)
+        await job_manager.run_in_thread(metrics.write)
         
-        # Send Script for Review
-        keyboard = InlineKeyboardMarkup()
-        keyboard.row(
-            InlineKeyboardButton("Approve Script", callback_data='approve_script'),
-            InlineKeyboardButton("Edit Script", callback_data='edit_script_instruction')
-        )
-        
-        # Send Synthesis Report for Review
-        kb_text = (
-            f"🧠 **Relatório de Síntese (Base do Roteiro):**\n\n"
-            f"📌 **Mensagem Central:** {knowledge_base.get('core_message')}\n\n"
-            f"🎣 **Estratégia de Gancho:** {knowledge_base.get('hook_strategy')}\n\n"
-            f"💡 **Insights Chave:**\n" + 
-            "\n".join([f"- {i}" for i in knowledge_base.get('key_insights_for_script', [])]) + "\n\n"
-            f"🎨 **Direção Visual:** {knowledge_base.get('visual_direction')}\n"
-            f"🗣️ **Tom de Voz:** {knowledge_base.get('tone_guide')}\n"
-        )
+        # Only cache complete runs; agents report failures in-band
+        failed = any('error' in report for report in (academic_report, social_report, knowledge_base))
+        if not failed and not script.startswith("Error generating script"):
+            await job_manager.run_in_thread(pipeline_cache.put_json, cache_key, {
+                'pdf_extracted': extracted_data,
+                'knowledge_base': knowledge_base,
+                'script': script,
+            })
         
-        # Send split messages if too long, but usually this is short enough
-        # Removing parse_mode='Markdown' to prevent errors with unescaped characters from AI
-        await bot.send_message(chat_id, kb_text)
-
-        await bot.send_message(chat_id,
-            f"🎬 **Generated Script:**\n\n{script}",
-            parse_mode='Markdown',
-            reply_markup=keyboard
-        )
+        await send_script_for_review(chat_id, knowledge_base, script)
         
-        set_state(chat_id, BotState.REVIEWING_SCRIPT)
+    except FileTooLargeError as e:
+        await bot.reply_to(message, f"This PDF is too large. {e}.")
+        set_state(chat_id, BotState.WAITING_FOR_PDF)
         
     except Exception as e:
         logger.error(f"Processing error: {e}")
         await bot.reply_to(message, "Failed to process the PDF.")
         set_state(chat_id, BotState.WAITING_FOR_PDF)
+        raise
+
+async def send_script_for_review(chat_id, knowledge_base: dict, script: str, offer_regenerate: bool = False):
+    """Posts the synthesis report and the script with the Approve/Edit keyboard."""
+    # Send Script for Review
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(
+        InlineKeyboardButton("Approve Script", callback_data='approve_script'),
+        InlineKeyboardButton("Edit Script", callback_data='edit_script_instruction')
+    )
+    if offer_regenerate:
+        keyboard.row(InlineKeyboardButton("🔄 Force regenerate", callback_data='force_regenerate'))
+    
+    # Send Synthesis Report for Review
+    kb_text = (
+        f"🧠 **Relatório de Síntese (Base do Roteiro):**\n\n"
+        f"📌 **Mensagem Central:** {knowledge_base.get('core_message')}\n\n"
+        f"🎣 **Estratégia de Gancho:** {knowledge_base.get('hook_strategy')}\n\n"
+        f"💡 **Insights Chave:**\n" + 
+        "\n".join([f"- {i}" for i in knowledge_base.get('key_insights_for_script', [])]) + "\n\n"
+        f"🎨 **Direção Visual:** {knowledge_base.get('visual_direction')}\n"
+        f"🗣️ **Tom de Voz:** {knowledge_base.get('tone_guide')}\n"
+    )
+    
+    # Send split messages if too long, but usually this is short enough
+    # Removing parse_mode='Markdown' to prevent errors with unescaped characters from AI
+    await bot.send_message(chat_id, kb_text)
+
+    await bot.send_message(chat_id,
+        f"🎬 **Generated Script:**\n\n{script}",
+        parse_mode='Markdown',
+        reply_markup=keyboard
+    )
+    
+    set_state(chat_id, BotState.REVIEWING_SCRIPT)
+    start_speculative_render(chat_id)
 
 @bot.callback_query_handler(func=lambda call: True)
 async def handle_query(call: CallbackQuery):
     """Handle callback queries."""
     chat_id = call.message.chat.id
     data = call.data
-    user_d = get_data(chat_id)
     
     if data == 'approve_script':
         await bot.answer_callback_query(call.id, "Script approved!")
@@ -202,74 +373,263 @@ async def handle_query(call: CallbackQuery):
         await bot.send_message(chat_id, "Who will narrate the video?", reply_markup=keyboard)
         set_state(chat_id, BotState.WAITING_FOR_NARRATION_CHOICE)
 
+    elif data == 'force_regenerate':
+        await bot.answer_callback_query(call.id, "Regenerating...")
+        await bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
+        if not get_data(chat_id).get('pdf_path'):
+            await bot.send_message(chat_id, "Please send the PDF again.")
+            return
+        job = enqueue_job(chat_id, "pdf", lambda job: run_pdf_pipeline(job, call.message, force=True))
+        await bot.send_message(chat_id, f"Re-running the full analysis (job {job.id}).")
+
     elif data == 'edit_script_instruction':
         await bot.answer_callback_query(call.id)
+        cancel_speculative_render(chat_id)
         await bot.send_message(chat_id, "Please send me your feedback or the revised text.")
         # State remains REVIEWING_SCRIPT
 
     elif data == 'narrate_ai':
+        # A double tap (or an old keyboard) must not start a second narration and video
+        if get_state(chat_id) != BotState.WAITING_FOR_NARRATION_CHOICE:
+            await bot.answer_callback_query(call.id, "The narration has already been chosen.")
+            return
+        set_state(chat_id, BotState.GENERATING_VIDEO)
         await bot.answer_callback_query(call.id)
         await bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
-        await bot.send_message(chat_id, "Generating AI narration... 🎙️")
-        
-        current_script = user_d.get('current_script', "")
-        
-        # Clean script
-        # Clean script for audio (remove Visual, Tempo, labels)
-        import re
-        # Remove lines starting with **Visual:** or **Tempo:**
-        clean_text = re.sub(r'\*\*Visual:\*\*.*', '', current_script)
-        clean_text = re.sub(r'\*\*Tempo:\*\*.*', '', clean_text)
-        # Remove **Texto:** label
-        clean_text = re.sub(r'\*\*Texto:\*\*', '', clean_text)
-        # Remove empty lines
-        clean_text = os.linesep.join([s for s in clean_text.splitlines() if s.strip()])
-        
-        # Generate Audio
-        from src.media.audio_generator import AudioGenerator
-        audio_gen = AudioGenerator()
-        
-        output_dir = "output"
-        os.makedirs(output_dir, exist_ok=True)
-        audio_path = os.path.join(output_dir, "final_voiceover.mp3")
-        
-        try:
-            await audio_gen.generate_narration(clean_text, audio_path)
-            user_d['audio_path'] = audio_path
-            save_data(chat_id)
-            save_data(chat_id)
-            
-            await bot.send_message(chat_id, "Audio generated! Starting video production... 🎬")
-            await generate_video_flow(chat_id, user_d)
-            
-        except Exception as e:
-            logger.error(f"Audio generation failed: {e}")
-            await bot.send_message(chat_id, "Failed to generate audio.")
+        job = enqueue_job(chat_id, "video", lambda job: run_ai_narration(job, chat_id))
+        await bot.send_message(chat_id, f"Generating AI narration... 🎙️ (job {job.id})")
+
+    elif data == 'approve_video':
+        # Buttons on an old preview (or a double tap) must not start a second render
+        if get_state(chat_id) != BotState.REVIEWING_PREVIEW:
+            await bot.answer_callback_query(call.id, "This preview is no longer active.")
+            return
+        set_state(chat_id, BotState.GENERATING_VIDEO)
+        await bot.answer_callback_query(call.id, "Preview approved!")
+        await bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
+        job = enqueue_job(chat_id, "video", lambda job: run_final_render(job, chat_id))
+        await bot.send_message(chat_id, f"Rendering the final video... 🎬 (job {job.id})")
+
+    elif data == 'rerender_video':
+        if get_state(chat_id) != BotState.REVIEWING_PREVIEW:
+            await bot.answer_callback_query(call.id, "This preview is no longer active.")
+            return
+        set_state(chat_id, BotState.GENERATING_VIDEO)
+        await bot.answer_callback_query(call.id)
+        await bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
+        job = enqueue_job(chat_id, "video", lambda job: run_preview_rerender(job, chat_id))
+        await bot.send_message(chat_id, f"Generating new visuals for another preview... (job {job.id})")
 
     elif data == 'narrate_user':
+        if get_state(chat_id) != BotState.WAITING_FOR_NARRATION_CHOICE:
+            await bot.answer_callback_query(call.id, "The narration has already been chosen.")
+            return
+        set_state(chat_id, BotState.WAITING_FOR_VOICE_UPLOAD)
         await bot.answer_callback_query(call.id)
         await bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
         await bot.send_message(chat_id, "Please record a voice message or upload an audio file.")
-        set_state(chat_id, BotState.WAITING_FOR_VOICE_UPLOAD)
 
-@bot.message_handler(content_types=['text'])
-async def handle_text(message: Message):
+def start_speculative_render(chat_id):
+    """Pre-renders narration and images for the script under review, within the chat's budget."""
+    if not SPECULATIVE_RENDER:
+        return
+    import time
+    cancel_speculative_render(chat_id)
+    data = get_data(chat_id)
+    now = time.time()
+    runs = [t for t in data.get('speculative_runs', []) if now - t < 24 * 3600]
+    if len(runs) >= SPECULATIVE_DAILY_RUNS:
+        logger.info(f"Speculative budget exhausted for chat {chat_id}")
+        return
+    data['speculative_runs'] = runs + [now]
+    save_data(chat_id)
+    # The background lane has its own slots, so pre-renders never delay jobs a user is waiting for
+    enqueue_job(
+        chat_id, "speculative", lambda job: run_speculative_render(job, chat_id, data.get('script_hash')),
+        lane="background"
+    )
+
+def cancel_speculative_render(chat_id):
+    """Stops any pre-render for the chat and discards its files."""
+    job_manager.cancel_chat_jobs(chat_id, kind="speculative")
+    spec = get_data(chat_id).pop('speculative', None)
+    if spec:
+        JobWorkspace(chat_id, spec['job_id']).cleanup()
+        save_data(chat_id)
+
+async def run_speculative_render(job, chat_id, script_hash: str):
+    """Generates narration and images for a script that is not approved yet (runs as a background job)."""
+    from src.media.image_generator import ImageGenerator
+    
+    data = get_data(chat_id)
+    spec = {'job_id': job.id, 'script_hash': script_hash, 'status': 'running'}
+    data['speculative'] = spec
+    save_data(chat_id)
+    
+    script = load_script(chat_id)
+    workspace = JobWorkspace(chat_id, job.id)
+    audio_path = workspace.path("final_voiceover.mp3")
+    job.progress = "Pre-rendering narration and images"
+    tasks = [
+        asyncio.ensure_future(ImageGenerator(cancel_event=job.cancel_event).generate_images(script, workspace.subdir("frames"))),
+        asyncio.ensure_future(synthesize_narration(script, audio_path, cancel_event=job.cancel_event)),
+    ]
+    try:
+        image_paths, (audio_path, segment_durations) = await asyncio.gather(*tasks)
+    except BaseException:
+        # Cancelled (script edited) or failed: stop the other half too before its files are deleted
+        job.cancel_event.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        spec['status'] = 'failed'
+        workspace.cleanup()
+        raise
+    
+    spec.update(status='done', audio_path=audio_path, image_paths=image_paths, segment_durations=segment_durations)
+    if data.get('speculative') is spec:
+        save_data(chat_id)
+
+async def take_speculative_assets(chat_id):
+    """
+    Returns the pre-rendered assets if they match the approved script (waiting for
+    a run that is still in progress), or None. Stale pre-renders are discarded.
+    """
+    data = get_data(chat_id)
+    spec = data.get('speculative')
+    if not spec:
+        return None
+    if spec.get('script_hash') != data.get('script_hash'):
+        cancel_speculative_render(chat_id)
+        return None
+    
+    running = job_manager.get_job(spec['job_id'])
+    if running and running.status == JobStatus.QUEUED:
+        # It may wait behind other chats' pre-renders for a long time; render normally instead
+        cancel_speculative_render(chat_id)
+        return None
+    if spec['status'] == 'running' and running and running.task:
+        await asyncio.wait({running.task})
+        spec = data.get('speculative') or {}
+    
+    if spec.get('status') != 'done' or not os.path.exists(spec.get('audio_path', '')):
+        return None
+    data.pop('speculative', None)
+    save_data(chat_id)
+    return spec
+
+async def synthesize_narration(script: Script, audio_path: str, cancel_event=None) -> tuple:
+    """
+    AI voiceover for the script's narration (only the words to be spoken, no cues or timings).
+
+    Args:
+        script (Script): The approved script.
+        audio_path (str): Where to write the narration track.
+        cancel_event: The job's cancel flag, for work that may be abandoned (pre-renders).
+
+    Returns:
+        tuple: (audio path, seconds per narrated segment or None in single-call mode).
+
+    Raises:
+        ValueError: If the script has nothing to narrate.
+    """
+    from src.media.audio_generator import AudioGenerator, TTS_MODE
+    audio_gen = AudioGenerator(cancel_event=cancel_event)
+    texts = [s.narration for s in script if s.narration]
+    if not texts:
+        raise ValueError("The script has no narration text (no Texto: lines)")
+    if TTS_MODE == "segments":
+        return await audio_gen.generate_segmented_narration(texts, audio_path)
+    return await audio_gen.generate_narration(script.narration_text(), audio_path), None
+
+async def run_ai_narration(job, chat_id):
+    """Generates the AI voiceover and then produces the video (runs as a background job)."""
+    user_d = get_data(chat_id)
+    
+    workspace = JobWorkspace(chat_id, job.id)
+    audio_path = workspace.path("final_voiceover.mp3")
+    # The narration text is known, so subtitles can be timed without transcribing it back
+    user_d['narration_source'] = 'ai'
+    
+    # Narration and images may already have been rendered while the script was under review
+    prepared = await take_speculative_assets(chat_id)
+    if prepared:
+        await report_progress(job, chat_id, "⚡ Narration and visuals were prepared while you reviewed. Composing video... 🎬")
+        user_d['audio_path'] = prepared['audio_path']
+        user_d['segment_durations'] = prepared.get('segment_durations')
+        save_data(chat_id)
+        await generate_video_flow(job, chat_id, user_d, workspace, prepared=prepared)
+        return
+    
+    try:
+        job.progress = "Generating narration"
+        audio_path, segment_durations = await synthesize_narration(load_script(chat_id), audio_path)
+        user_d['audio_path'] = audio_path
+        user_d['segment_durations'] = segment_durations
+        save_data(chat_id)
+        
+    except Exception as e:
+        logger.error(f"Audio generation failed: {e}")
+        await bot.send_message(chat_id, f"Failed to generate audio: {e}")
+        set_state(chat_id, BotState.WAITING_FOR_NARRATION_CHOICE)
+        raise
+
+    await report_progress(job, chat_id, "Audio generated! Starting video production... 🎬")
+    await generate_video_flow(job, chat_id, user_d, workspace)
+
+async def run_voice_production(job, message: Message):
+    """Stores the user's narration in the job workspace and produces the video (runs as a background job)."""
     chat_id = message.chat.id
-    state = get_state(chat_id)
     user_d = get_data(chat_id)
+    workspace = JobWorkspace(chat_id, job.id)
     
-    if state == BotState.REVIEWING_SCRIPT:
-        user_feedback = message.text
-        current_script = user_d.get('current_script', "")
+    voice = message.voice or message.audio
+    try:
+        audio_path, _, _ = await stream_download(voice.file_id, workspace.dir, name="final_voiceover.mp3")
+        user_d['narration_source'] = 'user'
+        user_d.pop('segment_durations', None)
+    except FileTooLargeError as e:
+        await bot.reply_to(message, f"This recording is too large. {e}.")
+        set_state(chat_id, BotState.WAITING_FOR_VOICE_UPLOAD)
+        workspace.cleanup()
+        return
         
-        await bot.reply_to(message, "Revising script based on your feedback...")
+    user_d['audio_path'] = audio_path
+    save_data(chat_id)
+    
+    # Pre-rendered images (if any) are still valid; the pre-rendered AI narration is not used
+    prepared = await take_speculative_assets(chat_id)
+    await generate_video_flow(job, chat_id, user_d, workspace, prepared=prepared)
+
+async def run_script_revision(job, message: Message, feedback_text: str = None):
+    """Revises the current script from text or voice feedback (runs as a background job)."""
+    chat_id = message.chat.id
+    voice = message.voice or message.audio
+    workspace = JobWorkspace(chat_id, job.id) if voice else None
+    
+    try:
+        if voice:
+            # Download voice
+            job.progress = "Downloading feedback"
+            voice_path, _, _ = await stream_download(voice.file_id, workspace.dir, name="feedback.ogg")
+            
+            # Transcribe
+            from src.media.transcription_service import TranscriptionService
+            transcriber = TranscriptionService()
+            job.progress = "Transcribing feedback"
+            feedback_text = await transcriber.transcribe_audio(voice_path)
+            
+            await bot.send_message(chat_id, f"📝 **Transcribed Feedback:**\n_{feedback_text}_", parse_mode='Markdown')
+            await report_progress(job, chat_id, "Revising script based on this feedback...")
         
+        # Revise Script
+        current_script = get_large(chat_id, 'current_script', "")
         from src.agents.script_agent import ScriptAgent
         script_agent = ScriptAgent()
-        revised_script = await script_agent.revise_script(current_script, user_feedback)
+        job.progress = "Revising script"
+        revised, diff = await script_agent.revise_segments(load_script(chat_id), feedback_text, current_script)
         
-        user_d['current_script'] = revised_script
-        save_data(chat_id)
+        revised_script = store_script(chat_id, revised)
         
         keyboard = InlineKeyboardMarkup()
         keyboard.row(
@@ -277,152 +637,264 @@ async def handle_text(message: Message):
             InlineKeyboardButton("Edit Script", callback_data='edit_script_instruction')
         )
         
+        changed = [str(d['index'] + 1) for d in diff or [] if d['status'] != 'unchanged']
+        summary = f"Updated segments: {', '.join(changed)}\n\n" if diff is not None else ""
+        if diff is not None and not changed:
+            summary = "No segment needed changes for this feedback.\n\n"
+        
         await bot.send_message(chat_id,
-            f"🎬 **Revised Script:**\n\n{revised_script}",
+            f"🎬 **Revised Script:**\n\n{summary}{revised_script}",
             parse_mode='Markdown',
             reply_markup=keyboard
         )
+        start_speculative_render(chat_id)
+        
+    except FileTooLargeError as e:
+        await bot.reply_to(message, f"This recording is too large. {e}.")
+        
+    except Exception as e:
+        logger.error(f"Script revision error: {e}")
+        await bot.reply_to(message, "Failed to process voice feedback." if voice else "Failed to revise the script.")
+        raise
+    
+    finally:
+        # Cleanup
+        if workspace:
+            workspace.cleanup()
+
+@bot.message_handler(content_types=['text'])
+async def handle_text(message: Message):
+    chat_id = message.chat.id
+    state = get_state(chat_id)
+    
+    if state == BotState.REVIEWING_SCRIPT:
+        # Two revisions of the same script would race, and the last one to finish would win
+        if job_manager.active_jobs(chat_id, "revision"):
+            await bot.reply_to(message, "Still revising the script. Please send more feedback once the new version arrives.")
+            return
+        user_feedback = message.text
+        await bot.reply_to(message, "Revising script based on your feedback...")
+        enqueue_job(chat_id, "revision", lambda job: run_script_revision(job, message, feedback_text=user_feedback))
 
 @bot.message_handler(content_types=['voice', 'audio'])
 async def handle_voice(message: Message):
     chat_id = message.chat.id
     state = get_state(chat_id)
-    user_d = get_data(chat_id)
+    voice = message.voice or message.audio
+    
+    try:
+        check_file_size(voice.file_size)
+    except FileTooLargeError as e:
+        await bot.reply_to(message, f"This recording is too large. {e}.")
+        return
     
     if state == BotState.REVIEWING_SCRIPT:
+        if job_manager.active_jobs(chat_id, "revision"):
+            await bot.reply_to(message, "Still revising the script. Please send more feedback once the new version arrives.")
+            return
         await bot.reply_to(message, "🎤 Listening to your feedback...")
-        
-        # Download voice
-        voice = message.voice or message.audio
-        file_info = await bot.get_file(voice.file_id)
-        downloaded_file = await bot.download_file(file_info.file_path)
-        
-        # Save temp file
-        temp_dir = "temp_audio"
-        os.makedirs(temp_dir, exist_ok=True)
-        voice_path = os.path.join(temp_dir, f"feedback_{voice.file_id}.ogg")
-        
-        with open(voice_path, 'wb') as new_file:
-            new_file.write(downloaded_file)
-            
-        # Transcribe
-        try:
-            from src.media.transcription_service import TranscriptionService
-            transcriber = TranscriptionService()
-            feedback_text = await transcriber.transcribe_audio(voice_path)
-            
-            await bot.send_message(chat_id, f"📝 **Transcribed Feedback:**\n_{feedback_text}_", parse_mode='Markdown')
-            await bot.send_message(chat_id, "Revising script based on this feedback...")
-            
-            # Revise Script
-            current_script = user_d.get('current_script', "")
-            from src.agents.script_agent import ScriptAgent
-            script_agent = ScriptAgent()
-            revised_script = await script_agent.revise_script(current_script, feedback_text)
-            
-            user_d['current_script'] = revised_script
-            save_data(chat_id)
-            
-            keyboard = InlineKeyboardMarkup()
-            keyboard.row(
-                InlineKeyboardButton("Approve Script", callback_data='approve_script'),
-                InlineKeyboardButton("Edit Script", callback_data='edit_script_instruction')
-            )
-            
-            await bot.send_message(chat_id,
-                f"🎬 **Revised Script:**\n\n{revised_script}",
-                parse_mode='Markdown',
-                reply_markup=keyboard
-            )
-            
-            # Cleanup
-            os.remove(voice_path)
-            
-        except Exception as e:
-            logger.error(f"Voice feedback error: {e}")
-            await bot.reply_to(message, "Failed to process voice feedback.")
+        enqueue_job(chat_id, "revision", lambda job: run_script_revision(job, message))
 
     elif state == BotState.WAITING_FOR_VOICE_UPLOAD:
-        voice = message.voice or message.audio
-        file_info = await bot.get_file(voice.file_id)
-        downloaded_file = await bot.download_file(file_info.file_path)
-        
-        output_dir = "output"
-        os.makedirs(output_dir, exist_ok=True)
-        audio_path = os.path.join(output_dir, "final_voiceover.mp3")
-        
-        with open(audio_path, 'wb') as new_file:
-            new_file.write(downloaded_file)
-            
-        user_d['audio_path'] = audio_path
-        save_data(chat_id)
-        
-        await bot.reply_to(message, "Voice received! Starting video production... 🎬")
-        await generate_video_flow(chat_id, user_d)
+        set_state(chat_id, BotState.GENERATING_VIDEO)
+        job = enqueue_job(chat_id, "video", lambda job: run_voice_production(job, message))
+        await bot.reply_to(message, f"Voice received! Starting video production... 🎬 (job {job.id})")
 
-async def generate_video_flow(chat_id, user_d):
-    """Orchestrates image generation, video composition, and delivery."""
-    await bot.send_message(chat_id, "🎨 Generating visuals (this takes a moment)...")
-    
-    current_script = user_d.get('current_script', "")
+async def generate_video_flow(job, chat_id, user_d, workspace: JobWorkspace, prepared: dict = None):
+    """
+    Orchestrates image generation, video composition, and delivery inside the job's workspace.
+    `prepared` holds assets from a speculative pre-render; its images are used instead of generating new ones.
+    With VIDEO_PREVIEW the flow stops after a draft render and waits for the user's approval.
+    """
+    script = load_script(chat_id)
     audio_path = user_d.get('audio_path')
     
     # 1. Generate Images
     from src.media.image_generator import ImageGenerator
     image_gen = ImageGenerator()
-    output_dir = "output"
     
     try:
-        image_paths = await image_gen.generate_images(current_script, output_dir)
+        image_paths = [p for p in (prepared or {}).get('image_paths', []) if os.path.exists(p)]
+        if not image_paths:
+            await report_progress(job, chat_id, "🎨 Generating visuals (this takes a moment)...")
+            image_paths = await image_gen.generate_images(script, workspace.subdir("frames"))
         
         if not image_paths:
             await bot.send_message(chat_id, "Failed to generate images. Aborting.")
+            set_state(chat_id, BotState.WAITING_FOR_PDF)
             return
 
-        await bot.send_message(chat_id, f"✅ Generated {len(image_paths)} images. Composing video...")
+        await report_progress(job, chat_id, f"✅ Generated {len(image_paths)} images. Composing video...")
         
         # 1.5 Generate Subtitles (New Step)
-        subtitles = []
-        try:
-            from src.media.transcription_service import TranscriptionService
-            transcriber = TranscriptionService()
-            await bot.send_message(chat_id, "📝 Generating subtitles...")
-            subtitles = await transcriber.transcribe_for_subtitles(audio_path)
-        except Exception as e:
-            logger.error(f"Subtitle generation failed: {e}")
-            # Continue without subtitles
-        
-        # 2. Compose Video
-        from src.media.video_composer import VideoComposer
-        composer = VideoComposer()
-        video_path = os.path.join(output_dir, "final_video.mp4")
-        
-        # Compose video (synchronous call, might block loop, but okay for MVP)
-        composer.compose_video(audio_path, image_paths, video_path, subtitles=subtitles)
-        
-        await bot.send_message(chat_id, "✅ Video composed! Uploading...")
-        
-        # 3. Send to User
-        with open(video_path, 'rb') as video:
-            await bot.send_video(chat_id, video, caption="Here is your AI-generated video! 🚀")
-        
-        # 4. Automatic Publication
-        from src.services.publication_service import PublicationService
-        pub_service = PublicationService()
-        
-        kb = user_d.get('knowledge_base', {})
-        metadata = {
-            "title": kb.get("core_message", "AI Research Video"),
-            "description": kb.get("hook_strategy", "Generated by AI"),
-            "hashtags": "#Research #AI #Education"
+        await report_progress(job, chat_id, "📝 Generating subtitles...")
+        subtitles = await build_subtitles(script, user_d, audio_path)
+        
+        # Everything the composer needs, kept so the final render after a preview reuses it
+        user_d['render'] = {
+            'job_id': workspace.job_id,
+            'prepared_job_id': (prepared or {}).get('job_id'),
+            'audio_path': audio_path,
+            'image_paths': image_paths,
+            # Word objects are stored (and sent to the process pool) as plain dicts
+            'subtitles': [w if isinstance(w, dict) else {'word': w.word, 'start': w.start, 'end': w.end} for w in subtitles],
+            # Each image stays on screen while its narration plays: measured per segment for AI
+            # narration, the script's timings otherwise (even split without either)
+            'durations': script.visual_durations(user_d.get('segment_durations')),
         }
+        save_data(chat_id)
         
-        pub_service.publish_video(video_path, metadata)
-        await bot.send_message(chat_id, "✅ Sent to publication webhook (Zapier).")
-        
-        set_state(chat_id, BotState.WAITING_FOR_PDF)
+        if VIDEO_PREVIEW:
+            await send_preview(job, chat_id, user_d['render'], workspace)
+        else:
+            await render_final_video(job, chat_id, user_d, workspace)
         
     except Exception as e:
         logger.error(f"Video production failed: {e}")
         await bot.send_message(chat_id, f"Video production failed: {e}")
+        set_state(chat_id, BotState.WAITING_FOR_PDF)
+        raise
+
+async def build_subtitles(script: Script, user_d: dict, audio_path: str) -> list:
+    """
+    Word timestamps for the captions. AI narration is timed from the script's own
+    text and the audio length; recorded narration is transcribed with Whisper.
+    """
+    from src.media.subtitle_timing import SUBTITLE_TIMING, words_from_narration
+    if SUBTITLE_TIMING == "text" and user_d.get('narration_source') == 'ai':
+        try:
+            from src.media.ffmpeg_utils import probe_duration
+            total = await job_manager.run_in_thread(probe_duration, audio_path)
+            texts = [s.narration for s in script if s.narration]
+            return words_from_narration(texts, total, user_d.get('segment_durations'))
+        except Exception as e:
+            logger.warning(f"Local subtitle timing failed, transcribing instead: {e}")
+    
+    try:
+        from src.media.transcription_service import TranscriptionService
+        transcriber = TranscriptionService()
+        return await transcriber.transcribe_for_subtitles(audio_path)
+    except Exception as e:
+        logger.error(f"Subtitle generation failed: {e}")
+        # Continue without subtitles
+        return []
+
+async def send_preview(job, chat_id, render: dict, workspace: JobWorkspace):
+    """Renders the low-resolution draft and sends it with the Approve/Re-render keyboard."""
+    from src.media.video_composer import VideoComposer
+    composer = VideoComposer(preview=True)
+    preview_path = workspace.path("preview.mp4")
+    
+    job.progress = "Rendering preview"
+    await job_manager.run_in_process(
+        composer.compose_video, render['audio_path'], render['image_paths'], preview_path,
+        render['subtitles'], render['durations']
+    )
+    
+    keyboard = InlineKeyboardMarkup()
+    keyboard.row(
+        InlineKeyboardButton("✅ Approve video", callback_data='approve_video'),
+        InlineKeyboardButton("🔄 Re-render", callback_data='rerender_video')
+    )
+    with open(preview_path, 'rb') as video:
+        await bot.send_video(chat_id, video, caption="👀 Draft preview (low resolution). Approve it to render the final video.", reply_markup=keyboard)
+    set_state(chat_id, BotState.REVIEWING_PREVIEW)
 
+def discard_render(chat_id):
+    """Drops the assets kept for a preview that was never approved."""
+    render = get_data(chat_id).pop('render', None)
+    if render:
+        JobWorkspace(chat_id, render['job_id']).cleanup()
+        if render.get('prepared_job_id'):
+            JobWorkspace(chat_id, render['prepared_job_id']).cleanup()
+        save_data(chat_id)
+
+async def run_final_render(job, chat_id):
+    """Full-quality render of an approved preview from its stored assets (runs as a background job)."""
+    user_d = get_data(chat_id)
+    render = user_d.get('render')
+    if not render or not all(os.path.exists(p) for p in [render['audio_path'], *render['image_paths']]):
+        await bot.send_message(chat_id, "The preview's files are no longer available. Please start again with a PDF.")
+        set_state(chat_id, BotState.WAITING_FOR_PDF)
+        return
+    
+    await report_progress(job, chat_id, "🎬 Rendering the final video...")
+    try:
+        await render_final_video(job, chat_id, user_d, JobWorkspace(chat_id, render['job_id']))
+    except Exception as e:
+        logger.error(f"Final render failed: {e}")
+        await bot.send_message(chat_id, f"Video production failed: {e}")
+        set_state(chat_id, BotState.WAITING_FOR_PDF)
+        raise
+
+async def run_preview_rerender(job, chat_id):
+    """Generates fresh images for the approved script and sends a new preview (runs as a background job)."""
+    from src.media.image_generator import ImageGenerator
+    user_d = get_data(chat_id)
+    render = user_d.get('render')
+    if not render or not os.path.exists(render['audio_path']):
+        await bot.send_message(chat_id, "The preview's files are no longer available. Please start again with a PDF.")
+        set_state(chat_id, BotState.WAITING_FOR_PDF)
+        return
+    
+    workspace = JobWorkspace(chat_id, render['job_id'])
+    await report_progress(job, chat_id, "🎨 Generating new visuals...")
+    # Skip the cache, otherwise the same frames would come back
+    image_paths = await ImageGenerator(use_cache=False).generate_images(load_script(chat_id), workspace.subdir("frames"))
+    if not image_paths:
+        await bot.send_message(chat_id, "Failed to generate images. Keeping the previous preview.")
+        set_state(chat_id, BotState.REVIEWING_PREVIEW)
+        return
+    render['image_paths'] = image_paths
+    save_data(chat_id)
+    await send_preview(job, chat_id, render, workspace)
+
+async def render_final_video(job, chat_id, user_d, workspace: JobWorkspace):
+    """Full-quality composition, then delivery and publication."""
+    render = user_d['render']
+    audio_path = render['audio_path']
+    
+    # 2. Compose Video
+    from src.media.video_composer import VideoComposer
+    composer = VideoComposer()
+    video_path = workspace.path("final_video.mp4")
+    
+    # Encoding is CPU-bound, so it runs in the process pool
+    job.progress = "Composing video"
+    await job_manager.run_in_process(
+        composer.compose_video, audio_path, render['image_paths'], video_path,
+        render['subtitles'], render['durations']
+    )
+    
+    # Publish the finished files atomically; the scratch frames are no longer needed
+    video_path = workspace.promote(video_path)
+    user_d['audio_path'] = workspace.promote(audio_path)
+    user_d['video_path'] = video_path
+    user_d.pop('render', None)
+    save_data(chat_id)
+    if not KEEP_WORKSPACES:
+        workspace.cleanup()
+        if render.get('prepared_job_id'):
+            JobWorkspace(chat_id, render['prepared_job_id']).cleanup()
+    
+    await report_progress(job, chat_id, "✅ Video composed! Uploading...")
+    
+    # 3. Send to User
+    with open(video_path, 'rb') as video:
+        await bot.send_video(chat_id, video, caption="Here is your AI-generated video! 🚀")
+    
+    # 4. Automatic Publication
+    from src.services.publication_service import PublicationService
+    pub_service = PublicationService()
+    
+    kb = get_large(chat_id, 'knowledge_base', {})
+    metadata = {
+        "title": kb.get("core_message", "AI Research Video"),
+        "description": kb.get("hook_strategy", "Generated by AI"),
+        "hashtags": "#Research #AI #Education"
+    }
+    
+    await job_manager.run_in_thread(pub_service.publish_video, video_path, metadata)
+    await bot.send_message(chat_id, "✅ Sent to publication webhook (Zapier).")
+    
+    set_state(chat_id, BotState.WAITING_FOR_PDF)
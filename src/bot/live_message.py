@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import time
+from telebot.asyncio_helper import ApiTelegramException
+from src.bot.bot_instance import bot
+
+logger = logging.getLogger(__name__)
+
+# Telegram tolerates roughly one edit per second per chat; stay below that
+LIVE_EDIT_INTERVAL = float(os.getenv("LIVE_EDIT_INTERVAL", "1.5"))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+class LiveMessage:
+    """
+    A single Telegram message that is edited in place as content arrives.
+
+    Edits are throttled to one per LIVE_EDIT_INTERVAL seconds, skipped when
+    the text did not change, and paused for the `retry_after` Telegram sends
+    with a 429. Intermediate updates may be dropped (a failed edit is logged
+    and never interrupts the caller); `finish` always lands, as a new message
+    if the edit fails.
+    """
+
+    def __init__(self, chat_id, header: str = ""):
+        self.chat_id = chat_id
+        self.header = header
+        self.message_id = None
+        self._last_text = None
+        self._next_edit_at = 0.0
+
+    async def start(self, text: str):
+        message = await bot.send_message(self.chat_id, self._render(text))
+        self.message_id = message.message_id
+        self._last_text = self._render(text)
+        self._next_edit_at = time.monotonic() + LIVE_EDIT_INTERVAL
+
+    def _render(self, text: str) -> str:
+        body = f"{self.header}{text}" if self.header else text
+        if len(body) > TELEGRAM_MESSAGE_LIMIT:
+            # Show the most recent part while streaming
+            body = "…" + body[-(TELEGRAM_MESSAGE_LIMIT - 1):]
+        return body
+
+    async def update(self, text: str):
+        """Edits the message if the throttle allows it; otherwise the update is skipped."""
+        if self.message_id is None or time.monotonic() < self._next_edit_at:
+            return
+        try:
+            await self._edit(text)
+        except Exception as e:
+            # Network errors and timeouts included: a lost progress edit must not fail the work being shown
+            self._next_edit_at = time.monotonic() + LIVE_EDIT_INTERVAL
+            logger.warning(f"Live message update failed: {e}")
+
+    async def finish(self, text: str):
+        """Final edit, sent regardless of the throttle (once any rate-limit pause has passed)."""
+        if self.message_id is None:
+            await self.start(text)
+            return
+        try:
+            await self._edit(text, force=True)
+        except Exception as e:
+            logger.warning(f"Live message final edit failed, sending a new message: {e}")
+            await bot.send_message(self.chat_id, self._render(text))
+
+    async def _edit(self, text: str, force: bool = False):
+        rendered = self._render(text)
+        if rendered == self._last_text:
+            return
+        try:
+            await bot.edit_message_text(rendered, chat_id=self.chat_id, message_id=self.message_id)
+            self._last_text = rendered
+            self._next_edit_at = time.monotonic() + LIVE_EDIT_INTERVAL
+        except ApiTelegramException as e:
+            if e.error_code == 429:
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 5)
+                self._next_edit_at = time.monotonic() + retry_after
+                logger.warning(f"Telegram rate limit on live message, pausing edits for {retry_after}s")
+                if force:
+                    await asyncio.sleep(retry_after)
+                    await self._edit(text)
+            elif "message is not modified" not in e.description:
+                raise
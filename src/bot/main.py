@@ -2,6 +2,7 @@ import src.bot.force_ipv4 # Force IPv4 before anything else
 import asyncio
 import logging
 from src.bot.bot_instance import bot
+from src.jobs.job_manager import job_manager
 import src.bot.handlers # Import to register handlers via decorators
 
 # Configure logging
@@ -12,7 +13,10 @@ logging.basicConfig(
 
 async def main():
     print("Bot is running (AsyncTeleBot)...")
-    await bot.polling(request_timeout=60)
+    try:
+        await bot.polling(request_timeout=60)
+    finally:
+        job_manager.shutdown()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from enum import Enum
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "bot_state.db")
+LEGACY_STATE_FILE = "bot_state.json"
+STATE_FLUSH_DELAY = float(os.getenv("STATE_FLUSH_DELAY", "0.5"))
+
+class StateBackend:
+    """Storage interface: one record (state name + data dict) per chat."""
+
+    def load_chat(self, chat_id: str):
+        """Returns (state_name, data) for a chat, or (None, None) if it is unknown."""
+        raise NotImplementedError
+
+    def write_chats(self, records: dict):
+        """Persists {chat_id: (state_name, data_json)} for the chats that changed."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class JsonStateBackend(StateBackend):
+    """
+    The original single-file format. Kept for development setups; every write
+    still rewrites the whole file, but through a temp file and an atomic rename.
+    """
+
+    def __init__(self, path: str = LEGACY_STATE_FILE):
+        self.path = path
+        self._states, self._data = {}, {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    raw = json.load(f)
+                self._states, self._data = raw.get('states', {}), raw.get('data', {})
+            except Exception as e:
+                logger.error(f"Failed to load state: {e}")
+
+    def load_chat(self, chat_id: str):
+        if chat_id not in self._states and chat_id not in self._data:
+            return None, None
+        return self._states.get(chat_id), self._data.get(chat_id, {})
+
+    def write_chats(self, records: dict):
+        for chat_id, (state, data_json) in records.items():
+            self._states[chat_id] = state
+            self._data[chat_id] = json.loads(data_json)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'states': self._states, 'data': self._data}, f)
+        os.replace(tmp_path, self.path)
+
+class SqliteStateBackend(StateBackend):
+    """
+    One row per chat in a WAL-mode SQLite database. A write touches only the
+    chats that changed, and a crash can never leave a half-written file.
+    """
+
+    def __init__(self, db_path: str = STATE_DB_PATH, legacy_path: str = LEGACY_STATE_FILE):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chats ("
+            " chat_id TEXT PRIMARY KEY,"
+            " state TEXT,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chats_updated_at ON chats(updated_at)")
+        self._conn.commit()
+        self._migrate_legacy(legacy_path)
+
+    def _migrate_legacy(self, legacy_path: str):
+        """One-time import of bot_state.json into an empty database."""
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM chats").fetchone()
+        if count:
+            return
+
+        try:
+            with open(legacy_path, 'r') as f:
+                raw = json.load(f)
+        except Exception as e:
+            # The old writer could die mid-dump; keep the file aside rather than retrying forever
+            logger.error(f"Legacy state file {legacy_path} is unreadable, skipping migration: {e}")
+            os.replace(legacy_path, f"{legacy_path}.corrupt")
+            return
+
+        states, data = raw.get('states', {}), raw.get('data', {})
+        records = {}
+        for chat_id in set(states) | set(data):
+            state = states.get(chat_id)
+            records[str(chat_id)] = (
+                None if state is None else str(state),
+                json.dumps(data.get(chat_id, {}))
+            )
+        self.write_chats(records)
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        logger.info(f"Migrated {len(records)} chats from {legacy_path} to {self.db_path}")
+
+    def load_chat(self, chat_id: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, data FROM chats WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        return row[0], json.loads(row[1])
+
+    def write_chats(self, records: dict):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO chats (chat_id, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET state = excluded.state, data = excluded.data, "
+                "updated_at = excluded.updated_at",
+                [(chat_id, state, data_json, now) for chat_id, (state, data_json) in records.items()]
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_state_backend(kind: str = None) -> StateBackend:
+    kind = (kind or STATE_BACKEND).lower()
+    if kind == "json":
+        return JsonStateBackend()
+    if kind == "sqlite":
+        return SqliteStateBackend()
+    raise ValueError(f"Unknown STATE_BACKEND: {kind}")
+
+class StateStore:
+    """
+    In-memory view of per-chat state over a StateBackend.
+
+    Chats are loaded on first access (startup cost does not grow with the
+    number of users). Changes only mark the chat dirty; dirty chats are
+    written together after `flush_delay` seconds, so several quick
+    set_state/save_data calls cost a single write.
+    """
+
+    def __init__(self, backend: StateBackend, state_enum, default_state, flush_delay: float = STATE_FLUSH_DELAY):
+        self.backend = backend
+        self.state_enum = state_enum
+        self.default_state = default_state
+        self.flush_delay = flush_delay
+        self._states = {}
+        self._data = {}
+        self._loaded = set()
+        self._dirty = set()
+        self._flush_handle = None
+
+    def _ensure_loaded(self, chat_id: str):
+        if chat_id in self._loaded:
+            return
+        state_name, data = self.backend.load_chat(chat_id)
+        self._states[chat_id] = self._decode_state(state_name)
+        self._data[chat_id] = data if data is not None else {}
+        self._loaded.add(chat_id)
+
+    def _decode_state(self, raw):
+        if raw is None:
+            return None
+        if raw in self.state_enum.__members__:
+            return self.state_enum[raw]
+        try:
+            # Legacy files stored the enum value
+            return self.state_enum(int(raw))
+        except (ValueError, TypeError):
+            logger.warning(f"Unknown stored state {raw!r}, resetting")
+            return None
+
+    def get_state(self, chat_id):
+        chat_id = str(chat_id)
+        self._ensure_loaded(chat_id)
+        state = self._states.get(chat_id)
+        return self.default_state if state is None else state
+
+    def set_state(self, chat_id, state):
+        chat_id = str(chat_id)
+        self._ensure_loaded(chat_id)
+        self._states[chat_id] = state
+        self.mark_dirty(chat_id)
+
+    def get_data(self, chat_id) -> dict:
+        chat_id = str(chat_id)
+        self._ensure_loaded(chat_id)
+        return self._data[chat_id]
+
+    def mark_dirty(self, chat_id):
+        self._dirty.add(str(chat_id))
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop (scripts, shutdown): write through
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self.flush)
+
+    def flush(self):
+        """Writes every dirty chat in one batch."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, set()
+        records = {}
+        for chat_id in dirty:
+            state = self._states.get(chat_id)
+            state_name = state.name if isinstance(state, Enum) else state
+            records[chat_id] = (state_name, json.dumps(self._data.get(chat_id, {})))
+        try:
+            self.backend.write_chats(records)
+        except Exception as e:
+            logger.error(f"Failed to save state: {e}")
+            self._dirty |= dirty
+
+    def close(self):
+        self.flush()
+        self.backend.close()
@@ -7,3 +7,4 @@ class BotState(Enum):
     WAITING_FOR_NARRATION_CHOICE = auto()
     WAITING_FOR_VOICE_UPLOAD = auto()
     GENERATING_VIDEO = auto()
+    REVIEWING_PREVIEW = auto()
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from enum import Enum, auto
+
+logger = logging.getLogger(__name__)
+
+class JobStatus(Enum):
+    QUEUED = auto()
+    RUNNING = auto()
+    DONE = auto()
+    FAILED = auto()
+    CANCELLED = auto()
+
+class JobCancelledError(Exception):
+    """Raised by blocking work that notices its job was cancelled before starting a call."""
+
+def check_cancelled(cancel_event):
+    """Raises JobCancelledError if `cancel_event` (a Job's cancel_event, or None) is set."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise JobCancelledError("Job was cancelled")
+
+def cancellable(cancel_event, fn):
+    """
+    Wraps a blocking call (e.g. a paid API request) for asyncio.to_thread so it
+    checks `cancel_event` in the worker thread right before it starts. Calls
+    still queued for a thread when their job is cancelled then never run.
+    """
+    def call(*args, **kwargs):
+        check_cancelled(cancel_event)
+        return fn(*args, **kwargs)
+    return call
+
+class Job:
+    """A unit of background work owned by a single chat."""
+
+    def __init__(self, job_id: str, chat_id, kind: str, lane: str = "default"):
+        self.id = job_id
+        self.chat_id = chat_id
+        self.kind = kind
+        self.lane = lane
+        # Set on cancellation; worker threads check it, since cancelling the task does not stop them
+        self.cancel_event = threading.Event()
+        self.status = JobStatus.QUEUED
+        self.progress = "Queued"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.status in (JobStatus.QUEUED, JobStatus.RUNNING)
+
+    def describe(self) -> str:
+        return f"{self.kind} [{self.id}] - {self.status.name.lower()}: {self.progress}"
+
+class JobManager:
+    """
+    Runs bot work in the background so handlers only enqueue and return.
+
+    Jobs are asyncio tasks gated by a semaphore (at most `max_concurrent_jobs`
+    run at once, the rest wait in QUEUED). Speculative work goes to the
+    "background" lane, which has its own smaller limit so it never takes a
+    slot from jobs a user is waiting for. Blocking SDK calls go to a bounded
+    thread pool, which is also installed as the loop's default executor so
+    `asyncio.to_thread` shares the same bound. CPU-bound stages (PDF parsing,
+    video encoding) go to a process pool.
+    """
+
+    def __init__(self, max_concurrent_jobs: int = None, thread_workers: int = None, process_workers: int = None):
+        self.max_concurrent_jobs = max_concurrent_jobs or int(os.getenv("JOB_MAX_CONCURRENT", "4"))
+        self.thread_workers = thread_workers or int(os.getenv("JOB_THREAD_WORKERS", "16"))
+        self.process_workers = process_workers or int(os.getenv("JOB_PROCESS_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+        self.max_jobs_per_chat = int(os.getenv("JOB_HISTORY_PER_CHAT", "10"))
+        self.lane_limits = {
+            "default": self.max_concurrent_jobs,
+            "background": int(os.getenv("JOB_BACKGROUND_CONCURRENT", "1")),
+        }
+
+        self._thread_pool = None
+        self._process_pool = None
+        self._semaphores = {}
+        self._loop = None
+        self._jobs = {}
+        self._jobs_by_chat = {}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphores = {lane: asyncio.Semaphore(limit) for lane, limit in self.lane_limits.items()}
+            loop.set_default_executor(self.thread_pool)
+        return loop
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="job-io")
+        return self._thread_pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # "spawn" keeps the workers independent of the bot's event loop and threads
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    def submit(self, chat_id, kind: str, job_fn, lane: str = "default") -> Job:
+        """
+        Enqueues a job and returns immediately.
+
+        Args:
+            chat_id: The chat that owns the job.
+            kind (str): Short label shown in /status (e.g. "pdf", "video").
+            job_fn: Coroutine function called as `job_fn(job)` once a slot is free.
+            lane (str): "default", or "background" for work nobody is waiting on.
+
+        Returns:
+            Job: The queued job.
+        """
+        self._bind_loop()
+        if lane not in self.lane_limits:
+            raise ValueError(f"Unknown job lane: {lane}")
+        job = Job(uuid.uuid4().hex[:12], chat_id, kind, lane)
+        self._jobs[job.id] = job
+        chat_jobs = self._jobs_by_chat.setdefault(str(chat_id), [])
+        chat_jobs.append(job.id)
+        self._prune(chat_jobs)
+
+        job.task = asyncio.create_task(self._run(job, job_fn), name=f"job-{kind}-{job.id}")
+        logger.info(f"Queued {kind} job {job.id} for chat {chat_id}")
+        return job
+
+    async def _run(self, job: Job, job_fn):
+        try:
+            async with self._semaphores[job.lane]:
+                job.status = JobStatus.RUNNING
+                job.progress = "Running"
+                logger.info(f"Starting {job.kind} job {job.id}")
+                await job_fn(job)
+            job.status = JobStatus.DONE
+            job.progress = "Done"
+        except asyncio.CancelledError:
+            job.cancel_event.set()
+            job.status = JobStatus.CANCELLED
+            job.progress = "Cancelled"
+            logger.info(f"Job {job.id} cancelled")
+        except Exception as e:
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+            job.progress = f"Failed: {e}"
+            logger.exception(f"Job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self, chat_jobs: list):
+        # Keep only the most recent finished jobs per chat; active ones are never dropped
+        while len(chat_jobs) > self.max_jobs_per_chat:
+            oldest = self._jobs.get(chat_jobs[0])
+            if oldest is not None and oldest.is_active:
+                break
+            chat_jobs.pop(0)
+            self._jobs.pop(oldest.id if oldest else None, None)
+
+    async def run_in_thread(self, fn, *args, **kwargs):
+        """Runs a blocking (I/O-bound) callable on the bounded thread pool."""
+        loop = self._bind_loop()
+        return await loop.run_in_executor(self.thread_pool, lambda: fn(*args, **kwargs))
+
+    async def run_in_process(self, fn, *args):
+        """Runs a CPU-bound, picklable callable on the process pool."""
+        loop = self._bind_loop()
+        return await loop.run_in_executor(self.process_pool, fn, *args)
+
+    def get_job(self, job_id: str):
+        return self._jobs.get(job_id)
+
+    def jobs_for_chat(self, chat_id) -> list:
+        return [self._jobs[j] for j in self._jobs_by_chat.get(str(chat_id), []) if j in self._jobs]
+
+    def active_jobs(self, chat_id, kind: str = None) -> list:
+        return [j for j in self.jobs_for_chat(chat_id) if j.is_active and (kind is None or j.kind == kind)]
+
+    def cancel_chat_jobs(self, chat_id, kind: str = None) -> int:
+        """Cancels the chat's active jobs (optionally only of one kind). Returns how many were cancelled."""
+        cancelled = 0
+        for job in self.active_jobs(chat_id, kind):
+            if job.task and not job.task.done():
+                job.cancel_event.set()
+                job.task.cancel()
+                cancelled += 1
+        return cancelled
+
+    def shutdown(self):
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+
+job_manager = JobManager()
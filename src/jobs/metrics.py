@@ -0,0 +1,91 @@
+import contextvars
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.getenv("PIPELINE_METRICS_FILE", os.path.join("logs", "pipeline_metrics.jsonl"))
+
+# (PipelineMetrics, stage name) for the code currently running; copied into tasks by asyncio
+_current_stage = contextvars.ContextVar("pipeline_stage", default=None)
+
+class PipelineMetrics:
+    """
+    Wall time, LLM calls and token usage per pipeline stage.
+
+    Usage:
+        metrics = PipelineMetrics(mode="combined")
+        with metrics.stage("analysis"):
+            ...  # gemini_client.generate() calls are attributed to "analysis"
+        metrics.write()
+    """
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self.stages = {}
+        self.started_at = time.time()
+
+    def _stage(self, name: str) -> dict:
+        return self.stages.setdefault(name, {
+            "seconds": 0.0, "llm_calls": 0, "cache_hits": 0, "prompt_tokens": 0, "output_tokens": 0
+        })
+
+    @contextmanager
+    def stage(self, name: str):
+        stats = self._stage(name)
+        token = _current_stage.set((self, name))
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats["seconds"] += time.perf_counter() - start
+            _current_stage.reset(token)
+
+    def add_usage(self, stage: str, prompt_tokens: int = 0, output_tokens: int = 0, cached: bool = False):
+        stats = self._stage(stage)
+        stats["llm_calls"] += 1
+        stats["cache_hits"] += int(cached)
+        stats["prompt_tokens"] += prompt_tokens or 0
+        stats["output_tokens"] += output_tokens or 0
+
+    def totals(self) -> dict:
+        keys = ("seconds", "llm_calls", "cache_hits", "prompt_tokens", "output_tokens")
+        return {k: sum(s[k] for s in self.stages.values()) for k in keys}
+
+    def to_dict(self) -> dict:
+        return {
+            **self.labels,
+            "started_at": self.started_at,
+            "wall_seconds": time.time() - self.started_at,
+            "stages": self.stages,
+            "totals": self.totals(),
+        }
+
+    def summary(self) -> str:
+        lines = []
+        for name, s in self.stages.items():
+            lines.append(
+                f"{name}: {s['seconds']:.1f}s, {s['llm_calls']} calls ({s['cache_hits']} cached), "
+                f"{s['prompt_tokens']} in / {s['output_tokens']} out tokens"
+            )
+        return "\n".join(lines)
+
+    def write(self, path: str = None):
+        """Appends this run as one JSON line, for comparing modes over time."""
+        path = path or METRICS_FILE
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(json.dumps(self.to_dict()) + "\n")
+        except Exception as e:
+            logger.error(f"Failed to write pipeline metrics: {e}")
+
+def record_llm_usage(prompt_tokens: int = 0, output_tokens: int = 0, cached: bool = False):
+    """Attributes one LLM call to the current stage, if any."""
+    current = _current_stage.get()
+    if current is not None:
+        metrics, stage = current
+        metrics.add_usage(stage, prompt_tokens, output_tokens, cached)
@@ -0,0 +1,63 @@
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_ROOT = os.getenv("JOB_WORKSPACE_DIR", os.path.join("output", "jobs"))
+ARTIFACT_ROOT = os.getenv("JOB_ARTIFACT_DIR", "output")
+
+class JobWorkspace:
+    """
+    Private scratch directory for one job, keyed by chat and job ID.
+
+    Every intermediate file (voiceover, frames, the video being encoded) is
+    written here, so concurrent productions never share paths. Finished
+    artifacts are moved into `<ARTIFACT_ROOT>/<chat_id>/<job_id>/` with an
+    atomic rename, so readers never see a half-written file.
+    """
+
+    def __init__(self, chat_id, job_id: str, root: str = None, artifact_root: str = None):
+        self.chat_id = str(chat_id)
+        self.job_id = job_id
+        self.dir = os.path.join(root or WORKSPACE_ROOT, self.chat_id, job_id)
+        self.artifact_dir = os.path.join(artifact_root or ARTIFACT_ROOT, self.chat_id, job_id)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        """Returns the path of a file inside the workspace."""
+        return os.path.join(self.dir, name)
+
+    def subdir(self, name: str) -> str:
+        """Returns (and creates) a directory inside the workspace."""
+        path = os.path.join(self.dir, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def promote(self, src_path: str, name: str = None) -> str:
+        """
+        Atomically publishes a finished file as a job artifact.
+
+        Args:
+            src_path (str): File inside the workspace.
+            name (str): Artifact file name (defaults to the source name).
+
+        Returns:
+            str: The final artifact path.
+        """
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        dest_path = os.path.join(self.artifact_dir, name or os.path.basename(src_path))
+        try:
+            os.replace(src_path, dest_path)
+        except OSError:
+            # Different filesystem: copy next to the destination, then rename into place
+            tmp_path = f"{dest_path}.{self.job_id}.tmp"
+            shutil.copy2(src_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+            os.remove(src_path)
+        logger.info(f"Promoted {src_path} -> {dest_path}")
+        return dest_path
+
+    def cleanup(self):
+        """Removes the scratch directory (promoted artifacts are kept)."""
+        shutil.rmtree(self.dir, ignore_errors=True)
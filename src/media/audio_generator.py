@@ -1,14 +1,32 @@
+import asyncio
 import logging
 import os
+import wave
 from openai import OpenAI
+from src.jobs.job_manager import cancellable, check_cancelled
+from src.storage.disk_cache import DiskCache
 
 logger = logging.getLogger(__name__)
 
+# "segments" synthesizes each script segment separately (concurrently, cached); "single" sends the whole text
+TTS_MODE = os.getenv("TTS_MODE", "segments")
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+# OpenAI's "pcm" format: raw 24 kHz, 16-bit, mono samples, so clips join without gaps and durations are exact
+PCM_RATE = 24000
+PCM_SAMPLE_BYTES = 2
+
+tts_cache = DiskCache(
+    "tts",
+    max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "300")) * 1024 * 1024)
+)
+
 class AudioGenerator:
-    def __init__(self):
+    def __init__(self, cancel_event=None):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.model = "tts-1"
         self.voice = "alloy" # Options: alloy, echo, fable, onyx, nova, shimmer
+        # Job.cancel_event for a pre-render; checked before each speech request and before writing the track
+        self.cancel_event = cancel_event
 
     async def generate_narration(self, text: str, output_path: str) -> str:
         """
@@ -24,16 +42,79 @@ class AudioGenerator:
         logger.info("Generating AI Narration...")
         
         try:
-            response = self.client.audio.speech.create(
+            # The OpenAI client is blocking, so keep it off the event loop
+            response = await asyncio.to_thread(
+                cancellable(self.cancel_event, self.client.audio.speech.create),
                 model=self.model,
                 voice=self.voice,
                 input=text
             )
             
-            response.stream_to_file(output_path)
+            check_cancelled(self.cancel_event)
+            await asyncio.to_thread(response.stream_to_file, output_path)
             logger.info(f"Audio saved to {output_path}")
             return output_path
 
         except Exception as e:
             logger.error(f"Error generating audio: {e}")
             raise
+
+    async def generate_segmented_narration(self, texts: list, output_path: str) -> tuple:
+        """
+        Synthesizes each segment's narration concurrently and joins the clips
+        into one track. Clips are cached by (text, voice, model), so after a
+        revision only the changed segments are synthesized again.
+        
+        Args:
+            texts (list): Narration per segment, in order.
+            output_path (str): The path to save the audio file (MP3; WAV if ffmpeg is unavailable).
+            
+        Returns:
+            tuple: (path of the audio file, list of per-segment durations in seconds).
+        """
+        logger.info(f"Generating AI Narration in {len(texts)} segments...")
+        semaphore = asyncio.Semaphore(TTS_CONCURRENCY)
+        
+        async def run(text):
+            async with semaphore:
+                return await self._synthesize_pcm(text)
+        
+        clips = await asyncio.gather(*(run(text) for text in texts))
+        durations = [len(clip) / (PCM_RATE * PCM_SAMPLE_BYTES) for clip in clips]
+        check_cancelled(self.cancel_event)
+        path = await asyncio.to_thread(self._write_track, b"".join(clips), output_path)
+        logger.info(f"Audio saved to {path} ({sum(durations):.1f}s)")
+        return path, durations
+
+    async def _synthesize_pcm(self, text: str) -> bytes:
+        key = DiskCache.make_key("tts", self.model, self.voice, "pcm", text.strip())
+        cached = await asyncio.to_thread(tts_cache.get_bytes, key)
+        if cached is not None:
+            return cached
+        
+        # The OpenAI client is blocking, so keep it off the event loop
+        response = await asyncio.to_thread(
+            cancellable(self.cancel_event, self.client.audio.speech.create),
+            model=self.model,
+            voice=self.voice,
+            input=text,
+            response_format="pcm"
+        )
+        pcm = await asyncio.to_thread(response.read)
+        await asyncio.to_thread(tts_cache.put_bytes, key, pcm)
+        return pcm
+
+    def _write_track(self, pcm: bytes, output_path: str) -> str:
+        """Encodes the joined PCM as MP3 with ffmpeg, or writes a WAV next to `output_path` without it."""
+        from src.media.ffmpeg_utils import ffmpeg_binary, run_ffmpeg
+        wav_path = os.path.splitext(output_path)[0] + ".wav"
+        with wave.open(wav_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(PCM_SAMPLE_BYTES)
+            wav.setframerate(PCM_RATE)
+            wav.writeframes(pcm)
+        if not ffmpeg_binary() or output_path == wav_path:
+            return wav_path
+        run_ffmpeg(["-y", "-i", wav_path, "-c:a", "libmp3lame", "-b:a", "128k", output_path])
+        os.remove(wav_path)
+        return output_path
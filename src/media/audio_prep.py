@@ -0,0 +1,81 @@
+import logging
+import os
+import re
+from src.media.ffmpeg_utils import run_ffmpeg
+
+logger = logging.getLogger(__name__)
+
+# Whisper works at 16 kHz mono; Opus at this bitrate keeps speech intact at a fraction of an MP3's size
+SPEECH_SAMPLE_RATE = 16000
+SPEECH_BITRATE = os.getenv("SPEECH_BITRATE", "24k")
+# Pauses at least this long (and this quiet) are cut out of voice notes and used as chunk boundaries
+SILENCE_THRESHOLD = os.getenv("SILENCE_THRESHOLD", "-40dB")
+SILENCE_MIN_SECONDS = float(os.getenv("SILENCE_MIN_SECONDS", "0.6"))
+
+SILENCE_START = re.compile(r'silence_start:\s*(-?\d+(?:\.\d+)?)')
+SILENCE_END = re.compile(r'silence_end:\s*(\d+(?:\.\d+)?)')
+
+def prepare_for_speech(src_path: str, dest_path: str, start: float = None, end: float = None, trim_silence: bool = False) -> str:
+    """
+    Re-encodes (part of) an audio file for transcription: mono, 16 kHz, Opus
+    in an Ogg container. The input format is detected from the content, so
+    mislabelled files (e.g. an OGG voice note named .mp3) come out right.
+
+    Args:
+        src_path (str): Any audio file ffmpeg can read.
+        dest_path (str): Output path (.ogg).
+        start (float): Optional start of the excerpt, in seconds.
+        end (float): Optional end of the excerpt, in seconds.
+        trim_silence (bool): Also cut out pauses. Shifts timestamps, so not for subtitles.
+
+    Returns:
+        str: `dest_path`.
+    """
+    args = ["-y"]
+    if start is not None:
+        args += ["-ss", f"{start:.3f}"]
+    if end is not None:
+        args += ["-to", f"{end:.3f}"]
+    args += ["-i", src_path, "-vn", "-ac", "1", "-ar", SPEECH_SAMPLE_RATE]
+    if trim_silence:
+        args += ["-af", (
+            f"silenceremove=start_periods=1:start_threshold={SILENCE_THRESHOLD}:"
+            f"stop_periods=-1:stop_duration={SILENCE_MIN_SECONDS}:stop_threshold={SILENCE_THRESHOLD}"
+        )]
+    args += ["-c:a", "libopus", "-b:a", SPEECH_BITRATE, "-application", "voip", dest_path]
+    run_ffmpeg(args)
+    return dest_path
+
+def detect_silences(path: str) -> list:
+    """Pauses in the audio as (start, end) seconds, from ffmpeg's silencedetect filter."""
+    log = run_ffmpeg([
+        "-i", path, "-vn",
+        "-af", f"silencedetect=noise={SILENCE_THRESHOLD}:d={SILENCE_MIN_SECONDS}",
+        "-f", "null", "-"
+    ])
+    starts = [max(0.0, float(v)) for v in SILENCE_START.findall(log)]
+    ends = [float(v) for v in SILENCE_END.findall(log)]
+    return list(zip(starts, ends))
+
+def plan_cuts(duration: float, silences: list, max_chunk: float) -> list:
+    """
+    Splits [0, duration] into chunks of at most about `max_chunk` seconds,
+    cutting in the middle of the last pause before each limit. Where a
+    stretch has no pause, it is cut at the limit.
+
+    Returns:
+        list: (start, end) seconds per chunk.
+    """
+    if duration <= max_chunk:
+        return [(0.0, duration)]
+    midpoints = [(start + end) / 2 for start, end in silences]
+    chunks, start = [], 0.0
+    while duration - start > max_chunk:
+        limit = start + max_chunk
+        # Prefer a pause in the second half of the window so chunks do not get tiny
+        candidates = [m for m in midpoints if start + max_chunk / 2 < m < limit]
+        cut = candidates[-1] if candidates else limit
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, duration))
+    return chunks
@@ -0,0 +1,111 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Explicit binary wins; otherwise the one bundled with moviepy (imageio-ffmpeg), then PATH
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "")
+
+# How often a running ffmpeg is checked against the render memory limit
+CHILD_POLL_INTERVAL = 0.05
+
+DURATION_PATTERN = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+def ffmpeg_binary():
+    """Path of the ffmpeg executable, or None if none is available."""
+    if FFMPEG_BINARY:
+        return FFMPEG_BINARY
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return shutil.which("ffmpeg")
+
+def run_ffmpeg(args: list, timeout: float = None) -> str:
+    """
+    Runs ffmpeg with the given arguments (without the binary itself). The
+    process's RSS is reported to any active RenderMonitor, and the process is
+    killed if the render goes over its memory limit.
+
+    Returns:
+        str: ffmpeg's stderr (where it writes its log).
+
+    Raises:
+        RenderMemoryError: If ffmpeg was killed for exceeding the render memory limit.
+        RuntimeError: If ffmpeg is missing or exits with an error.
+    """
+    from src.media.render_monitor import RenderMemoryError, record_child_rss, track_child
+    binary = ffmpeg_binary()
+    if not binary:
+        raise RuntimeError("ffmpeg is not available (install imageio-ffmpeg or set FFMPEG_BINARY)")
+    cmd = [binary, "-hide_banner", "-nostdin", *[str(a) for a in args]]
+    logger.debug(f"Running {' '.join(cmd)}")
+    
+    # stderr goes to a file so the process can be reaped with wait4, which also reports its peak memory
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=log)
+        timer = threading.Timer(timeout, process.kill) if timeout else None
+        if timer:
+            timer.start()
+        over_limit = False
+        try:
+            # Polled rather than blocking, so the process is only ever killed by the thread that reaps it
+            while True:
+                pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+                if pid:
+                    break
+                if not over_limit and track_child(process.pid):
+                    over_limit = True
+                    process.kill()
+                time.sleep(CHILD_POLL_INTERVAL)
+        finally:
+            if timer:
+                timer.cancel()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        record_child_rss(process.pid, usage.ru_maxrss)
+        log.seek(0)
+        stderr = log.read().decode('utf-8', errors='replace')
+    
+    if over_limit:
+        raise RenderMemoryError("ffmpeg was stopped: the render went over its memory limit (VIDEO_MEMORY_LIMIT_MB)")
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr.strip()[-1000:]}")
+    return stderr
+
+def probe_duration(path: str) -> float:
+    """Duration of a media file in seconds, read from ffmpeg's input summary (no ffprobe needed)."""
+    binary = ffmpeg_binary()
+    if not binary:
+        raise RuntimeError("ffmpeg is not available (install imageio-ffmpeg or set FFMPEG_BINARY)")
+    # Without an output ffmpeg exits with an error, but it prints the input summary first
+    result = subprocess.run([binary, "-hide_banner", "-nostdin", "-i", path], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    match = DURATION_PATTERN.search(result.stderr.decode('utf-8', errors='replace'))
+    if not match:
+        raise RuntimeError(f"Could not read the duration of {path}")
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def _quote(path: str) -> str:
+    return "'" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+def write_concat_list(image_paths: list, durations: list, list_path: str) -> str:
+    """
+    Writes an ffmpeg concat-demuxer list showing each image for its duration.
+
+    The last image is listed twice: the demuxer ignores the final `duration`
+    otherwise and the last frame would flash by.
+    """
+    lines = ["ffconcat version 1.0"]
+    for path, duration in zip(image_paths, durations):
+        lines.append(f"file {_quote(path)}")
+        lines.append(f"duration {duration:.3f}")
+    lines.append(f"file {_quote(image_paths[-1])}")
+    with open(list_path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    return list_path
@@ -1,81 +1,216 @@
+import asyncio
+import base64
+import io
 import logging
 import os
+import random
+import re
+import shutil
+import openai
 from openai import OpenAI
 import requests
+from PIL import Image
+from src.script.segments import Script
+from src.jobs.job_manager import JobCancelledError, cancellable, check_cancelled
+from src.storage.disk_cache import DiskCache
 
 logger = logging.getLogger(__name__)
 
+# Frames generated at the same time; DALL-E 3 rate limits are per minute, so keep this modest
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "4"))
+IMAGE_MAX_RETRIES = int(os.getenv("IMAGE_MAX_RETRIES", "4"))
+IMAGE_BACKOFF_BASE = float(os.getenv("IMAGE_BACKOFF_BASE", "2"))
+# "b64_json" returns the image inside the API response; "url" needs a second download
+IMAGE_RESPONSE_FORMAT = os.getenv("IMAGE_RESPONSE_FORMAT", "b64_json")
+
+# Frames are stored once, at the size and format the video is encoded from
+FRAME_SIZE = tuple(int(v) for v in os.getenv("FRAME_SIZE", "1080x1920").lower().split("x"))
+FRAME_FORMAT = os.getenv("FRAME_FORMAT", "jpeg").lower()  # jpeg | webp | png
+FRAME_QUALITY = int(os.getenv("FRAME_QUALITY", "90"))
+FRAME_EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "png": "png"}
+
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "1") == "1"
+# Finished frames keyed by cue, prompt version, model and frame settings; least recently used go first
+image_cache = DiskCache(
+    "images",
+    max_bytes=int(float(os.getenv("IMAGE_CACHE_MAX_MB", "500")) * 1024 * 1024)
+)
+
+def normalize_cue(cue: str) -> str:
+    """Cue text as compared by the cache: no markdown emphasis, case or spacing differences."""
+    cue = re.sub(r'[*_`]+', '', cue or "")
+    return re.sub(r'\s+', ' ', cue).strip().strip('.').lower()
+
+# Worth another attempt; anything else (e.g. a content policy rejection) fails the frame at once
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before the next attempt: the server's Retry-After if given, else exponential backoff with jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return IMAGE_BACKOFF_BASE ** attempt + random.uniform(0, 1)
+
+def save_frame(data: bytes, path: str, size: tuple = None) -> str:
+    """
+    Decodes a generated image and writes it as a video frame: scaled to cover
+    `size`, center-cropped, and encoded as FRAME_FORMAT.
+
+    Args:
+        data (bytes): The encoded image (PNG from the API).
+        path (str): Destination path (its extension should match FRAME_FORMAT).
+        size (tuple): (width, height), FRAME_SIZE by default.
+
+    Returns:
+        str: The path written.
+    """
+    width, height = size or FRAME_SIZE
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        scale = max(width / image.width, height / image.height)
+        resized = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+        left, top = (resized.width - width) // 2, (resized.height - height) // 2
+        frame = resized.crop((left, top, left + width, top + height))
+    
+    options = {"quality": FRAME_QUALITY} if FRAME_FORMAT in ("jpeg", "webp") else {}
+    if FRAME_FORMAT == "jpeg":
+        options["optimize"] = True
+    frame.save(path, format=FRAME_FORMAT.upper(), **options)
+    return path
+
+def _cache_frame(key: str, path: str):
+    with open(path, 'rb') as f:
+        image_cache.put_bytes(key, f.read())
+
 class ImageGenerator:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Bump when the prompt template changes so cached frames are not reused
+    PROMPT_VERSION = 1
+    IMAGE_SIZE = "1024x1792"
+
+    def __init__(self, concurrency: int = None, use_cache: bool = True, cancel_event=None):
+        # Retries are handled here so concurrent frames back off together instead of hammering the API
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
         self.model = "dall-e-3"
+        self.concurrency = concurrency or IMAGE_CONCURRENCY
+        self.session = requests.Session()
+        # False skips cache lookups (fresh images) but still stores the results
+        self.use_cache = use_cache
+        # Job.cancel_event for a pre-render; checked before each image request and before saving a frame
+        self.cancel_event = cancel_event
 
-    async def generate_images(self, script: str, output_dir: str) -> list:
+    async def generate_images(self, script, output_dir: str) -> list:
         """
-        Generates images based on the script scenes.
+        Generates images based on the script scenes, several at a time.
         
         Args:
-            script (str): The video script.
+            script (Script): The parsed video script (a markdown str is parsed here).
             output_dir (str): Directory to save images.
             
         Returns:
-            list: List of paths to generated images.
+            list: Paths to generated images in cue order (frames that failed are left out).
         """
-        logger.info("Generating Images...")
         os.makedirs(output_dir, exist_ok=True)
         
-        # Extract visual cues using regex
-        import re
-        # Matches **Visual:** ... (case insensitive, flexible spacing)
-        visual_cues = re.findall(r'\*\*Visual:\*\*\s*(.*)', script, re.IGNORECASE)
+        if isinstance(script, str):
+            script = Script.parse(script)
+        visual_cues = script.visual_cues()
+        logger.info(f"Generating {len(visual_cues)} images ({self.concurrency} at a time)...")
         
-        if not visual_cues:
-             # Fallback 1: Try [Visual: ...] format
-             visual_cues = re.findall(r'\[Visual: (.*?)\]', script, re.IGNORECASE)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Set while the API is rate limiting us, so no new request starts during the pause
+        resume = asyncio.Event()
+        resume.set()
         
-        if not visual_cues:
-             # Fallback 2: Try splitting by "Visual:" if it appears at start of lines
-             lines = script.split('\n')
-             for line in lines:
-                 if 'Visual:' in line:
-                     clean = line.replace('Visual:', '').replace('*', '').strip()
-                     if clean:
-                         visual_cues.append(clean)
+        async def run(i, cue):
+            async with semaphore:
+                try:
+                    return await self._generate_frame(i, cue, output_dir, resume)
+                except JobCancelledError:
+                    return None
+                except Exception as e:
+                    logger.error(f"Error generating image for cue {i}: {e}")
+                    # Continue even if one fails
+                    return None
         
-        image_paths = []
+        results = await asyncio.gather(*(run(i, cue) for i, cue in enumerate(visual_cues)))
+        image_paths = [path for path in results if path]
+        logger.info(f"Generated {len(image_paths)}/{len(visual_cues)} images")
+        return image_paths
+
+    def _cache_key(self, cue: str) -> str:
+        return DiskCache.make_key(
+            "image", self.PROMPT_VERSION, self.model, self.IMAGE_SIZE,
+            FRAME_SIZE, FRAME_FORMAT, FRAME_QUALITY, normalize_cue(cue)
+        )
+
+    async def _generate_frame(self, i: int, cue: str, output_dir: str, resume: asyncio.Event) -> str:
+        image_path = os.path.join(output_dir, f"frame_{i}.{FRAME_EXTENSIONS[FRAME_FORMAT]}")
+        key = self._cache_key(cue) if IMAGE_CACHE_ENABLED else None
+        if key and self.use_cache:
+            cached = await asyncio.to_thread(image_cache.path_for, key)
+            if cached:
+                await asyncio.to_thread(shutil.copyfile, cached, image_path)
+                logger.info(f"Image {i + 1} served from cache")
+                return image_path
         
-        # Generate image for EACH visual cue found
-        for i, cue in enumerate(visual_cues): 
+        # Enhanced prompt to avoid text and ensure quality
+        prompt = f"""
+        Vertical 9:16 image for educational video. 
+        Subject: {cue}. 
+        Style: Modern, clean, high quality illustration or minimalist infographic. 
+        IMPORTANT: Do NOT include any text, letters, or words in the image. Use icons and symbols only.
+        """
+        
+        for attempt in range(IMAGE_MAX_RETRIES + 1):
+            await resume.wait()
             try:
-                # Enhanced prompt to avoid text and ensure quality
-                prompt = f"""
-                Vertical 9:16 image for educational video. 
-                Subject: {cue}. 
-                Style: Modern, clean, high quality illustration or minimalist infographic. 
-                IMPORTANT: Do NOT include any text, letters, or words in the image. Use icons and symbols only.
-                """
-                
-                response = self.client.images.generate(
+                # The OpenAI client and requests are blocking, so keep them off the event loop
+                response = await asyncio.to_thread(
+                    cancellable(self.cancel_event, self.client.images.generate),
                     model=self.model,
                     prompt=prompt,
-                    size="1024x1792",
+                    size=self.IMAGE_SIZE,
                     quality="standard",
+                    response_format=IMAGE_RESPONSE_FORMAT,
                     n=1,
                 )
-                
-                image_url = response.data[0].url
-                image_path = os.path.join(output_dir, f"frame_{i}.png")
-                
-                # Download image
-                img_data = requests.get(image_url).content
-                with open(image_path, 'wb') as handler:
-                    handler.write(img_data)
-                
-                image_paths.append(image_path)
-                logger.info(f"Generated image {i+1}/{len(visual_cues)}")
-                
-            except Exception as e:
-                logger.error(f"Error generating image for cue {i}: {e}")
-                # Continue even if one fails
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == IMAGE_MAX_RETRIES:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning(f"Image {i} attempt {attempt + 1} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                if isinstance(e, openai.RateLimitError) and resume.is_set():
+                    resume.clear()
+                    try:
+                        await asyncio.sleep(delay)
+                    finally:
+                        resume.set()
+                else:
+                    await asyncio.sleep(delay)
         
-        return image_paths
+        image = response.data[0]
+        if image.b64_json:
+            data = base64.b64decode(image.b64_json)
+        else:
+            # Download image (the session keeps the connection to the CDN open between frames)
+            download = await asyncio.to_thread(self.session.get, image.url, timeout=60)
+            download.raise_for_status()
+            data = download.content
+        
+        # A cancelled job's workspace may already be gone
+        check_cancelled(self.cancel_event)
+        # Decode and re-encode once, straight to the frame the composer uses
+        await asyncio.to_thread(save_frame, data, image_path)
+        if key:
+            await asyncio.to_thread(_cache_frame, key, image_path)
+        
+        logger.info(f"Generated image {i + 1}")
+        return image_path
@@ -0,0 +1,124 @@
+import logging
+import os
+import resource
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Per-render ceiling for the resident memory of the composing process plus its ffmpeg encoders (0 = no limit)
+VIDEO_MEMORY_LIMIT_MB = float(os.getenv("VIDEO_MEMORY_LIMIT_MB", "0"))
+SAMPLE_INTERVAL = 0.2
+
+# Monitors of the renders running in this process; run_ffmpeg reports its children to them
+_active = set()
+_active_lock = threading.Lock()
+
+def _statm_rss_mb(pid) -> float:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+def current_rss_mb() -> float:
+    """Resident memory of this process in MB."""
+    try:
+        return _statm_rss_mb("self")
+    except (OSError, ValueError, IndexError):
+        # No procfs: fall back to the lifetime peak (kilobytes on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def track_child(pid: int) -> bool:
+    """
+    Records the current RSS of a running encoder process. run_ffmpeg polls
+    this while it waits, so encoders count towards the render's limit.
+
+    Returns:
+        bool: True if a render is over its memory limit and the process should be killed.
+    """
+    with _active_lock:
+        if not _active:
+            return False
+        try:
+            rss = _statm_rss_mb(pid)
+        except (OSError, ValueError, IndexError):
+            return False
+        over = False
+        for monitor in _active:
+            monitor.children_mb[pid] = rss
+            monitor._update()
+            over = over or monitor.exceeded
+        return over
+
+def record_child_rss(pid: int, max_rss_kb: int):
+    """Called with an encoder process's peak RSS (from wait4) once it exits."""
+    with _active_lock:
+        for monitor in _active:
+            monitor.children_mb.pop(pid, None)
+            monitor.child_peak_mb = max(monitor.child_peak_mb, max_rss_kb / 1024)
+
+class RenderMemoryError(MemoryError):
+    pass
+
+class RenderMonitor:
+    """
+    Samples the process's RSS during one render, keeps the peak, and flags
+    the render once it, plus the RSS of the ffmpeg processes it is running,
+    goes over `limit_mb`. Frame producers call `check()` and run_ffmpeg kills
+    its encoder, so an over-limit render stops instead of pushing the worker
+    into swap.
+
+    Usage:
+        with RenderMonitor() as monitor:
+            ...  # render, calling monitor.check() per frame
+        monitor.stats()
+    """
+
+    def __init__(self, limit_mb: float = None):
+        self.limit_mb = VIDEO_MEMORY_LIMIT_MB if limit_mb is None else limit_mb
+        self.peak_mb = 0.0
+        self.rss_mb = 0.0
+        self.child_peak_mb = 0.0
+        # Latest RSS of each running encoder process, by pid
+        self.children_mb = {}
+        self.exceeded = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak_mb = self.rss_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, name="render-monitor", daemon=True)
+        self._thread.start()
+        with _active_lock:
+            _active.add(self)
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        with _active_lock:
+            _active.discard(self)
+        return False
+
+    def _sample(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.rss_mb = current_rss_mb()
+            self.peak_mb = max(self.peak_mb, self.rss_mb)
+            with _active_lock:
+                self._update()
+
+    def _update(self):
+        # Called with _active_lock held
+        total = self.rss_mb + sum(self.children_mb.values())
+        if self.limit_mb and total > self.limit_mb and not self.exceeded:
+            self.exceeded = True
+            logger.warning(f"Render is using {total:.0f} MB, over the {self.limit_mb:.0f} MB limit")
+
+    def check(self):
+        """Raises RenderMemoryError if the render has gone over its memory limit."""
+        if self.exceeded:
+            raise RenderMemoryError(f"Render exceeded its memory limit of {self.limit_mb:.0f} MB (peak {self.peak_mb:.0f} MB)")
+
+    def stats(self) -> dict:
+        return {
+            "peak_rss_mb": round(self.peak_mb, 1),
+            "encoder_peak_rss_mb": round(self.child_peak_mb, 1),
+            "limit_mb": self.limit_mb or None,
+        }
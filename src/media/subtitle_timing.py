@@ -0,0 +1,67 @@
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# "text" times the known narration locally; "whisper" transcribes the audio again
+SUBTITLE_TIMING = os.getenv("SUBTITLE_TIMING", "text")
+
+# Extra weight (in characters) for the pause a TTS voice makes after punctuation
+COMMA_PAUSE = 3
+SENTENCE_PAUSE = 7
+
+def _word_timing(word: str) -> tuple:
+    """Relative (speaking, pause) time of a word: its letters and digits, then any pause after punctuation."""
+    speaking = max(1, len(re.sub(r'\W', '', word)))
+    if re.search(r'[.!?…:;]["»”)]*$', word):
+        return speaking, SENTENCE_PAUSE
+    if re.search(r'[,–—]["»”)]*$', word):
+        return speaking, COMMA_PAUSE
+    return speaking, 0
+
+def _weight(words: list) -> float:
+    return sum(sum(_word_timing(w)) for w in words)
+
+def _spread(words: list, start: float, end: float) -> list:
+    timings = [_word_timing(w) for w in words]
+    scale = (end - start) / _weight(words) if words else 0
+    timed, t = [], start
+    for word, (speaking, pause) in zip(words, timings):
+        timed.append({'word': word, 'start': round(t, 3), 'end': round(t + speaking * scale, 3)})
+        t += (speaking + pause) * scale
+    return timed
+
+def words_from_narration(segment_texts: list, total_duration: float, segment_durations: list = None) -> list:
+    """
+    Word timestamps for narration whose text is already known, in the
+    structure Whisper's word-level transcription returns.
+
+    Each segment occupies its synthesized duration when `segment_durations`
+    is given (one per text, e.g. from per-segment TTS); otherwise the total
+    is shared between segments by their length. Inside a segment, words get
+    time in proportion to their length plus a pause after punctuation.
+
+    Args:
+        segment_texts (list): Narration per segment, in order.
+        total_duration (float): Length of the narration audio in seconds.
+        segment_durations (list): Seconds of audio per segment, if known.
+
+    Returns:
+        list: [{'word': str, 'start': float, 'end': float}, ...]
+    """
+    segments = [text.split() for text in segment_texts]
+    if segment_durations and len(segment_durations) == len(segments):
+        spans = segment_durations
+    else:
+        weights = [_weight(words) for words in segments]
+        total_weight = sum(weights) or 1
+        spans = [total_duration * w / total_weight for w in weights]
+
+    timed, start = [], 0.0
+    for words, span in zip(segments, spans):
+        if words:
+            timed.extend(_spread(words, start, start + span))
+        start += span
+    logger.info(f"Timed {len(timed)} subtitle words from the narration text")
+    return timed
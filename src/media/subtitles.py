@@ -0,0 +1,151 @@
+import logging
+import os
+from src.storage.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Words shown together on screen
+SUBTITLE_WORDS = int(os.getenv("SUBTITLE_WORDS", "4"))
+SUBTITLE_FONT = os.getenv("SUBTITLE_FONT", "Arial")
+# A .ttf/.otf file for caption bitmaps; Pillow's bundled font is used otherwise
+SUBTITLE_FONT_FILE = os.getenv("SUBTITLE_FONT_FILE", "")
+SUBTITLE_FONT_SIZE = int(os.getenv("SUBTITLE_FONT_SIZE", "60"))
+# Distance of the captions from the bottom edge, in output pixels
+SUBTITLE_MARGIN = int(os.getenv("SUBTITLE_MARGIN", "160"))
+# Bump when the caption look changes so cached bitmaps are not reused
+CAPTION_STYLE_VERSION = 1
+
+caption_cache = DiskCache(
+    "captions",
+    max_bytes=int(float(os.getenv("CAPTION_CACHE_MAX_MB", "50")) * 1024 * 1024)
+)
+
+def group_captions(words: list, chunk_size: int = None) -> list:
+    """
+    Groups word timestamps into on-screen captions.
+
+    Args:
+        words (list): [{'word', 'start', 'end'}, ...] (Whisper word objects are accepted too).
+        chunk_size (int): Words per caption, SUBTITLE_WORDS by default.
+
+    Returns:
+        list: [{'text', 'start', 'end'}, ...]
+    """
+    chunk_size = chunk_size or SUBTITLE_WORDS
+    words = [w if isinstance(w, dict) else {'word': w.word, 'start': w.start, 'end': w.end} for w in words or []]
+    captions = []
+    for i in range(0, len(words), chunk_size):
+        chunk = words[i:i + chunk_size]
+        captions.append({
+            'text': " ".join(w['word'].strip() for w in chunk),
+            'start': chunk[0]['start'],
+            'end': chunk[-1]['end'],
+        })
+    return captions
+
+def shift_captions(captions: list, start: float, end: float) -> list:
+    """Captions overlapping [start, end), clipped to it and re-timed relative to `start`."""
+    return [
+        {'text': c['text'], 'start': max(c['start'], start) - start, 'end': min(c['end'], end) - start}
+        for c in captions
+        if c['end'] > start and c['start'] < end
+    ]
+
+def _srt_time(seconds: float) -> str:
+    ms = round(max(seconds, 0) * 1000)
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+def _ass_time(seconds: float) -> str:
+    cs = round(max(seconds, 0) * 100)
+    return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+def to_srt(captions: list) -> str:
+    blocks = [
+        f"{i}\n{_srt_time(c['start'])} --> {_srt_time(c['end'])}\n{c['text']}\n"
+        for i, c in enumerate(captions, 1)
+    ]
+    return "\n".join(blocks)
+
+def to_ass(captions: list, size: tuple) -> str:
+    """
+    Builds an ASS script with one styled event per caption: bold white text
+    with a black outline, bottom-centred and wrapped to 80% of the width.
+    """
+    width, height = size
+    side_margin = width // 10
+    header = "\n".join([
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+        "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, "
+        "MarginL, MarginR, MarginV, Encoding",
+        f"Style: Caption,{SUBTITLE_FONT},{SUBTITLE_FONT_SIZE},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,-1,0,"
+        f"0,0,100,100,0,0,1,3,0,2,{side_margin},{side_margin},{SUBTITLE_MARGIN},1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ])
+    events = [
+        f"Dialogue: 0,{_ass_time(c['start'])},{_ass_time(c['end'])},Caption,,0,0,0,,"
+        + c['text'].replace("\n", " ").replace("{", "(").replace("}", ")")
+        for c in captions
+    ]
+    return header + "\n" + "\n".join(events) + "\n"
+
+def write_subtitles(captions: list, path: str, size: tuple) -> str:
+    """Writes the captions as ASS or SRT, depending on the file extension."""
+    content = to_srt(captions) if path.lower().endswith(".srt") else to_ass(captions, size)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+def _load_font():
+    from PIL import ImageFont
+    if SUBTITLE_FONT_FILE:
+        return ImageFont.truetype(SUBTITLE_FONT_FILE, SUBTITLE_FONT_SIZE)
+    return ImageFont.load_default(SUBTITLE_FONT_SIZE)
+
+def _wrap(draw, text: str, font, max_width: int) -> list:
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    return lines + [current] if current else lines
+
+def render_caption(text: str, width: int) -> str:
+    """
+    Returns a transparent PNG of one caption, styled like the ASS track and
+    at most 80% of `width` wide. Bitmaps are cached, so a caption that
+    reappears (or a re-render) costs one file lookup.
+    """
+    key = DiskCache.make_key("caption", CAPTION_STYLE_VERSION, text, width, SUBTITLE_FONT_FILE, SUBTITLE_FONT_SIZE)
+    cached = caption_cache.path_for(key)
+    if cached:
+        return cached
+
+    import io
+    from PIL import Image, ImageDraw
+    font = _load_font()
+    stroke = 3
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    lines = _wrap(measure, text, font, int(width * 0.8))
+    line_height = SUBTITLE_FONT_SIZE + stroke * 2 + 6
+    canvas = Image.new("RGBA", (int(width * 0.8) + stroke * 2, line_height * len(lines) + stroke * 2), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(canvas)
+    for row, line in enumerate(lines):
+        x = (canvas.width - draw.textlength(line, font=font)) / 2
+        draw.text((x, stroke + row * line_height), line, font=font, fill="white", stroke_width=stroke, stroke_fill="black")
+
+    buffer = io.BytesIO()
+    canvas.save(buffer, format="PNG", optimize=True)
+    return caption_cache.put_bytes(key, buffer.getvalue())
@@ -1,9 +1,19 @@
+import asyncio
 import logging
 import os
+import tempfile
 from openai import OpenAI
+from src.media.audio_prep import prepare_for_speech, detect_silences, plan_cuts
+from src.media.ffmpeg_utils import ffmpeg_binary, probe_duration
 
 logger = logging.getLogger(__name__)
 
+# Re-encode to 16 kHz mono Opus before uploading (skipped when ffmpeg is unavailable)
+TRANSCRIBE_PREPROCESS = os.getenv("TRANSCRIBE_PREPROCESS", "1") == "1"
+# Longer audio is split on pauses into chunks of about this length, transcribed concurrently
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "300"))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+
 class TranscriptionService:
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -12,26 +22,24 @@ class TranscriptionService:
     async def transcribe_audio(self, audio_path: str) -> str:
         """
         Transcribes audio file to text using OpenAI Whisper.
-        
+
         Args:
             audio_path (str): Path to the audio file.
-            
+
         Returns:
             str: Transcribed text.
         """
         logger.info(f"Transcribing audio: {audio_path}")
         try:
-            with open(audio_path, "rb") as audio_file:
-                transcription = self.client.audio.transcriptions.create(
-                    model=self.model,
-                    file=audio_file,
-                    language="pt" # Force Portuguese detection/transcription
-                )
-            
-            text = transcription.text
+            with tempfile.TemporaryDirectory() as tmp:
+                # Pauses carry no words, so they are cut before uploading
+                pieces = await self._prepare(audio_path, tmp, trim_silence=True)
+                results = await self._transcribe_pieces(pieces, language="pt") # Force Portuguese detection/transcription
+
+            text = " ".join(transcription.text.strip() for transcription, _ in results)
             logger.info(f"Transcription complete: {text[:50]}...")
             return text
-            
+
         except Exception as e:
             logger.error(f"Transcription failed: {e}")
             raise
@@ -39,28 +47,88 @@ class TranscriptionService:
     async def transcribe_for_subtitles(self, audio_path: str) -> list:
         """
         Transcribes audio and returns word-level timestamps for subtitles.
-        
+
         Args:
             audio_path (str): Path to audio file.
-            
+
         Returns:
             list: List of dicts [{'word': str, 'start': float, 'end': float}, ...]
         """
         logger.info(f"Transcribing for subtitles: {audio_path}")
         try:
-            with open(audio_path, "rb") as audio_file:
-                transcription = self.client.audio.transcriptions.create(
-                    model=self.model,
-                    file=audio_file,
+            with tempfile.TemporaryDirectory() as tmp:
+                # Timestamps must match the original audio, so nothing is trimmed here
+                pieces = await self._prepare(audio_path, tmp, trim_silence=False)
+                results = await self._transcribe_pieces(
+                    pieces,
                     language="pt",
                     response_format="verbose_json",
                     timestamp_granularities=["word"]
                 )
-            
-            words = transcription.words
+
+            # Chunk timestamps are relative to the chunk; shift them back onto the full track
+            words = [
+                {'word': w.word, 'start': w.start + offset, 'end': w.end + offset}
+                for transcription, offset in results
+                for w in transcription.words or []
+            ]
             logger.info(f"Generated {len(words)} subtitle words.")
             return words
-            
+
         except Exception as e:
             logger.error(f"Subtitle transcription failed: {e}")
             return []
+
+    async def _prepare(self, audio_path: str, tmp_dir: str, trim_silence: bool) -> list:
+        """
+        Speech-optimized pieces of the audio to upload.
+
+        Returns:
+            list: (path, offset in seconds within the source) per piece; the
+            original file alone when preprocessing is off or fails.
+        """
+        if not TRANSCRIBE_PREPROCESS or not ffmpeg_binary():
+            return [(audio_path, 0.0)]
+        try:
+            source = audio_path
+            if trim_silence:
+                source = await asyncio.to_thread(
+                    prepare_for_speech, audio_path, os.path.join(tmp_dir, "trimmed.ogg"), trim_silence=True
+                )
+            duration = await asyncio.to_thread(probe_duration, source)
+            if duration <= TRANSCRIBE_CHUNK_SECONDS:
+                if source != audio_path:
+                    return [(source, 0.0)]
+                cuts = [(None, None)]
+            else:
+                silences = await asyncio.to_thread(detect_silences, source)
+                cuts = plan_cuts(duration, silences, TRANSCRIBE_CHUNK_SECONDS)
+                logger.info(f"Splitting {duration:.0f}s of audio into {len(cuts)} chunks")
+
+            paths = await asyncio.gather(*(
+                asyncio.to_thread(prepare_for_speech, source, os.path.join(tmp_dir, f"part_{n}.ogg"), start, end)
+                for n, (start, end) in enumerate(cuts)
+            ))
+            before, after = os.path.getsize(audio_path), sum(os.path.getsize(p) for p in paths)
+            logger.info(f"Prepared audio for upload: {before / 1024:.0f} KB -> {after / 1024:.0f} KB")
+            return [(path, start or 0.0) for path, (start, _) in zip(paths, cuts)]
+        except Exception as e:
+            logger.warning(f"Audio preprocessing failed, uploading the original file: {e}")
+            return [(audio_path, 0.0)]
+
+    async def _transcribe_pieces(self, pieces: list, **options) -> list:
+        """Transcribes the pieces concurrently; returns (transcription, offset) in order."""
+        semaphore = asyncio.Semaphore(TRANSCRIBE_CONCURRENCY)
+
+        async def run(path, offset):
+            async with semaphore:
+                with open(path, "rb") as audio_file:
+                    transcription = await asyncio.to_thread(
+                        self.client.audio.transcriptions.create,
+                        model=self.model,
+                        file=audio_file,
+                        **options
+                    )
+                return transcription, offset
+
+        return await asyncio.gather(*(run(path, offset) for path, offset in pieces))
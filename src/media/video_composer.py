@@ -1,11 +1,175 @@
+import bisect
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from moviepy import *
+from src.media.ffmpeg_utils import ffmpeg_binary, run_ffmpeg, probe_duration, write_concat_list
+from src.media.subtitles import group_captions, shift_captions, write_subtitles, render_caption
+from src.media.render_monitor import RenderMonitor, RenderMemoryError
+from src.jobs.metrics import PipelineMetrics
 
 logger = logging.getLogger(__name__)
 
+# "auto" uses ffmpeg (captions burned in from one ASS track) when available, moviepy otherwise
+VIDEO_ENGINE = os.getenv("VIDEO_ENGINE", "auto")
+VIDEO_SIZE = tuple(int(v) for v in os.getenv("FRAME_SIZE", "1080x1920").lower().split("x"))
+VIDEO_FPS = int(os.getenv("VIDEO_FPS", "24"))
+VIDEO_PRESET = os.getenv("VIDEO_PRESET", "medium")
+VIDEO_CRF = int(os.getenv("VIDEO_CRF", "23"))
+# x264 threads per encode (0 = ffmpeg's default); chunked renders split the cores between workers
+VIDEO_THREADS = int(os.getenv("VIDEO_THREADS", "0"))
+# Parallel encodes for chunked rendering; 1 renders the whole timeline in one pass. Renders already
+# run JOB_PROCESS_WORKERS at a time, so more than cpu_count // JOB_PROCESS_WORKERS oversubscribes the cores
+VIDEO_RENDER_WORKERS = int(os.getenv("VIDEO_RENDER_WORKERS", "1"))
+# Only videos at least this long are split; for short ones the extra processes and join cost more than they save
+VIDEO_CHUNK_MIN_SECONDS = float(os.getenv("VIDEO_CHUNK_MIN_SECONDS", "300"))
+# Draft render sent for approval before the full-quality encode
+PREVIEW_SIZE = tuple(int(v) for v in os.getenv("PREVIEW_SIZE", "540x960").lower().split("x"))
+PREVIEW_FPS = int(os.getenv("PREVIEW_FPS", "12"))
+PREVIEW_PRESET = os.getenv("PREVIEW_PRESET", "ultrafast")
+PREVIEW_CRF = int(os.getenv("PREVIEW_CRF", "32"))
+# moviepy path: produce each frame on demand (one decoded image in memory) instead of a clip per image
+VIDEO_STREAMING = os.getenv("VIDEO_STREAMING", "1") == "1"
+# moviepy path: overlay cached caption bitmaps instead of building a TextClip per caption
+CAPTION_BITMAPS = os.getenv("CAPTION_BITMAPS", "1") == "1"
+
+def frame_durations(total: float, count: int, weights: list = None) -> list:
+    """
+    Splits `total` seconds over `count` images, proportionally to `weights`
+    (e.g. segment durations from the script) or evenly without usable weights.
+    """
+    if not weights or len(weights) != count or any(not w or w <= 0 for w in weights):
+        return [total / count] * count
+    scale = total / sum(weights)
+    return [w * scale for w in weights]
+
+def snap_to_frames(seconds: list, fps: int) -> list:
+    """Rounds image durations to whole frames without drifting from the running total."""
+    snapped, elapsed, frames_so_far = [], 0.0, 0
+    for duration in seconds:
+        elapsed += duration
+        frames = round(elapsed * fps)
+        snapped.append((frames - frames_so_far) / fps)
+        frames_so_far = frames
+    return snapped
+
+def plan_render_chunks(seconds: list, workers: int) -> list:
+    """
+    Splits the timeline at image boundaries into at most `workers` runs of
+    roughly equal duration.
+
+    Returns:
+        list: (first, end) image index ranges covering every image.
+    """
+    count = min(workers, len(seconds))
+    if count <= 1 or sum(seconds) < VIDEO_CHUNK_MIN_SECONDS:
+        return [(0, len(seconds))]
+    target = sum(seconds) / count
+    chunks, first, elapsed = [], 0, 0.0
+    for i, duration in enumerate(seconds):
+        elapsed += duration
+        images_left, chunks_left = len(seconds) - i - 1, count - len(chunks) - 1
+        if chunks_left and (elapsed >= target * (len(chunks) + 1) or images_left == chunks_left):
+            chunks.append((first, i + 1))
+            first = i + 1
+    chunks.append((first, len(seconds)))
+    return [c for c in chunks if c[0] < c[1]]
+
+def _filter_path(path: str) -> str:
+    """Quotes a file path for use inside an ffmpeg filter argument (workspace paths never contain quotes)."""
+    path = os.path.abspath(path).replace("\\", "/")
+    return "'" + path.replace(":", "\\:") + "'"
+
+def load_frame(path: str, size: tuple):
+    """Decodes an image once, scaled to cover `size` and center-cropped, as an RGB array."""
+    import numpy as np
+    from PIL import Image
+    width, height = size
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        if image.size != (width, height):
+            scale = max(width / image.width, height / image.height)
+            image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+            left, top = (image.width - width) // 2, (image.height - height) // 2
+            image = image.crop((left, top, left + width, top + height))
+        return np.asarray(image)
+
+class StillFrameSource:
+    """
+    moviepy frame function for a slideshow: only the image on screen (and the
+    caption over it) is kept decoded; the previous one is released as soon as
+    the timeline moves past it.
+    """
+
+    def __init__(self, image_paths: list, seconds: list, size: tuple, captions: list = None, monitor: RenderMonitor = None):
+        self.image_paths = image_paths
+        self.size = size
+        self.captions = captions or []
+        self.monitor = monitor
+        self.starts = [sum(seconds[:i]) for i in range(len(seconds))]
+        self.caption_starts = [c['start'] for c in self.captions]
+        self._image = (None, None)
+        self._caption = (None, None)
+
+    def _current_image(self, t: float):
+        index = max(0, bisect.bisect_right(self.starts, t) - 1)
+        if self._image[0] != index:
+            self._image = (None, None)  # release before decoding the next one
+            self._image = (index, load_frame(self.image_paths[index], self.size))
+        return self._image[1]
+
+    def _current_caption(self, t: float):
+        index = bisect.bisect_right(self.caption_starts, t) - 1
+        if index < 0 or t >= self.captions[index]['end']:
+            return None
+        if self._caption[0] != index:
+            import numpy as np
+            from PIL import Image
+            with Image.open(render_caption(self.captions[index]['text'], self.size[0])) as bitmap:
+                self._caption = (index, np.asarray(bitmap.convert("RGBA")))
+        return self._caption[1]
+
+    def __call__(self, t: float):
+        if self.monitor:
+            self.monitor.check()
+        frame = self._current_image(t)
+        caption = self._current_caption(t) if self.captions else None
+        if caption is None:
+            return frame
+        
+        # Alpha-blend the caption bottom-centred, like the ('center', 'bottom') overlay clips
+        import numpy as np
+        height, width = caption.shape[:2]
+        height, width = min(height, frame.shape[0]), min(width, frame.shape[1])
+        top, left = frame.shape[0] - height, (frame.shape[1] - width) // 2
+        out = frame.copy()
+        region = out[top:top + height, left:left + width].astype(np.float32)
+        alpha = caption[:height, :width, 3:4].astype(np.float32) / 255
+        out[top:top + height, left:left + width] = (region * (1 - alpha) + caption[:height, :width, :3] * alpha).astype(np.uint8)
+        return out
+
 class VideoComposer:
-    def compose_video(self, audio_path: str, image_paths: list, output_path: str, subtitles: list = None):
+    def __init__(self, preview: bool = False):
+        """
+        Args:
+            preview (bool): Render a fast low-resolution, low-fps draft (PREVIEW_*) instead of the final video.
+        """
+        self.preview = preview
+        self._monitor = None
+        if preview:
+            self.size, self.fps, self.preset, self.crf, self.audio_bitrate = PREVIEW_SIZE, PREVIEW_FPS, PREVIEW_PRESET, PREVIEW_CRF, "96k"
+        else:
+            self.size, self.fps, self.preset, self.crf, self.audio_bitrate = VIDEO_SIZE, VIDEO_FPS, VIDEO_PRESET, VIDEO_CRF, "192k"
+
+    def select_engine(self, subtitles: list = None) -> str:
+        """Rendering engine for this video: "ffmpeg" or "moviepy"."""
+        engine = VIDEO_ENGINE.lower()
+        if engine == "moviepy" or not ffmpeg_binary():
+            return "moviepy"
+        # Captions are burned in by ffmpeg's ass filter, so subtitles no longer need per-frame compositing
+        return "ffmpeg"
+
+    def compose_video(self, audio_path: str, image_paths: list, output_path: str, subtitles: list = None, durations: list = None):
         """
         Composes the final video using audio and images, optionally with subtitles.
         
@@ -14,7 +178,158 @@ class VideoComposer:
             image_paths (list): List of paths to images.
             output_path (str): Path to save the final video.
             subtitles (list): List of word timestamps from Whisper.
+            durations (list): Relative on-screen time per image (scaled to the audio length); even split if omitted.
+        """
+        if not image_paths:
+            raise ValueError("No images provided for video composition.")
+        
+        engine = self.select_engine(subtitles)
+        with RenderMonitor() as monitor:
+            self._monitor = monitor
+            try:
+                path = None
+                if engine == "ffmpeg":
+                    try:
+                        path = self.compose_stills(audio_path, image_paths, output_path, durations, subtitles)
+                    except RenderMemoryError:
+                        # moviepy would only need more memory
+                        raise
+                    except Exception as e:
+                        logger.warning(f"ffmpeg render failed, falling back to moviepy: {e}")
+                        engine = "moviepy"
+                
+                if path is None:
+                    path = self._compose_moviepy(audio_path, image_paths, output_path, subtitles, durations)
+                # Catches a limit crossed after the last frame check (e.g. while muxing the audio)
+                monitor.check()
+                return path
+            finally:
+                self._monitor = None
+                self._report(monitor, engine, len(image_paths))
+
+    def _report(self, monitor: RenderMonitor, engine: str, image_count: int):
+        """Logs the render's peak memory and appends it to the pipeline metrics file."""
+        stats = monitor.stats()
+        logger.info(
+            f"Render ({engine}{', preview' if self.preview else ''}) peak RSS {stats['peak_rss_mb']} MB, "
+            f"encoder {stats['encoder_peak_rss_mb']} MB"
+        )
+        PipelineMetrics(
+            kind="render", engine=engine, preview=self.preview, images=image_count,
+            streaming=VIDEO_STREAMING, **stats
+        ).write()
+
+    def compose_stills(self, audio_path: str, image_paths: list, output_path: str, durations: list = None, subtitles: list = None) -> str:
         """
+        Renders a slideshow of still images straight with ffmpeg: a concat list
+        with per-image durations, encoded once and muxed with the audio. The
+        captions, if any, are written to one ASS file and burned in during the
+        same pass, so their number does not affect render time.
+
+        Long videos are split at image boundaries and the pieces encoded in
+        parallel (VIDEO_RENDER_WORKERS), then joined without re-encoding.
+        """
+        logger.info(f"Composing {'preview' if self.preview else 'video'} (ffmpeg still-image path)...")
+        total = probe_duration(audio_path)
+        seconds = snap_to_frames(frame_durations(total, len(image_paths), durations), self.fps)
+        captions = group_captions(subtitles)
+        
+        chunks = plan_render_chunks(seconds, VIDEO_RENDER_WORKERS)
+        if len(chunks) == 1:
+            self._encode_stills(image_paths, seconds, output_path, captions, audio_path=audio_path)
+        else:
+            self._encode_chunked(image_paths, seconds, output_path, captions, audio_path, chunks)
+        
+        logger.info(f"Video saved to {output_path}")
+        return output_path
+
+    def _encode_stills(self, image_paths: list, seconds: list, output_path: str, captions: list,
+                       audio_path: str = None, threads: int = None):
+        """One ffmpeg encode of a run of still images; video-only (exactly sum(seconds) long) without `audio_path`."""
+        list_path = write_concat_list(image_paths, seconds, f"{output_path}.concat.txt")
+        width, height = self.size
+        
+        filters = f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},setsar=1,fps={self.fps}"
+        subtitle_path = None
+        if captions:
+            # Styled for the final size; libass scales it down for previews
+            subtitle_path = write_subtitles(captions, f"{output_path}.ass", VIDEO_SIZE)
+            filters += f",ass={_filter_path(subtitle_path)}"
+        
+        args = ["-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_path:
+            args += ["-i", audio_path, "-map", "0:v", "-map", "1:a"]
+        args += [
+            "-vf", f"{filters},format=yuv420p",
+            "-c:v", "libx264", "-preset", self.preset, "-crf", self.crf, "-tune", "stillimage",
+            "-threads", VIDEO_THREADS if threads is None else threads,
+        ]
+        if audio_path:
+            args += ["-c:a", "aac", "-b:a", self.audio_bitrate, "-shortest", "-movflags", "+faststart"]
+        else:
+            args += ["-an", "-t", f"{sum(seconds):.3f}"]
+        
+        try:
+            run_ffmpeg(args + [output_path])
+        finally:
+            os.remove(list_path)
+            if subtitle_path:
+                os.remove(subtitle_path)
+
+    def _encode_chunked(self, image_paths: list, seconds: list, output_path: str, captions: list,
+                        audio_path: str, chunks: list):
+        """Encodes each chunk in its own ffmpeg process, then stream-copies them together and muxes the audio once."""
+        threads = VIDEO_THREADS or max(1, (os.cpu_count() or 1) // len(chunks))
+        logger.info(f"Rendering {len(chunks)} chunks in parallel ({threads} encoder threads each)...")
+        
+        parts = []
+        # Each encode is a separate ffmpeg process, so threads are enough to keep every core busy
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            futures = []
+            for n, (first, end) in enumerate(chunks):
+                start = sum(seconds[:first])
+                length = sum(seconds[first:end])
+                part_path = f"{output_path}.part{n}.mp4"
+                parts.append(part_path)
+                futures.append(pool.submit(
+                    self._encode_stills, image_paths[first:end], seconds[first:end], part_path,
+                    shift_captions(captions, start, start + length), None, threads
+                ))
+            try:
+                for future in futures:
+                    future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                self._remove(parts)
+                raise
+        
+        list_path = f"{output_path}.parts.txt"
+        with open(list_path, 'w') as f:
+            f.write("ffconcat version 1.0\n" + "".join(f"file '{os.path.abspath(p)}'\n" for p in parts))
+        try:
+            run_ffmpeg([
+                "-y",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-i", audio_path,
+                "-map", "0:v", "-map", "1:a",
+                "-c:v", "copy",
+                "-c:a", "aac", "-b:a", self.audio_bitrate,
+                "-shortest", "-movflags", "+faststart",
+                output_path,
+            ])
+        finally:
+            self._remove(parts + [list_path])
+
+    @staticmethod
+    def _remove(paths: list):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _compose_moviepy(self, audio_path: str, image_paths: list, output_path: str, subtitles: list = None, durations: list = None):
         logger.info("Composing Video...")
         
         try:
@@ -22,76 +337,40 @@ class VideoComposer:
             audio = AudioFileClip(audio_path)
             duration = audio.duration
             
-            if not image_paths:
-                raise ValueError("No images provided for video composition.")
-            
-            # Calculate duration per image
-            img_duration = duration / len(image_paths)
+            seconds = frame_durations(duration, len(image_paths), durations)
+            if VIDEO_STREAMING:
+                video = self._streaming_clip(image_paths, seconds, subtitles)
+                video = video.with_audio(audio)
+                video.write_videofile(output_path, fps=self.fps, codec='libx264', audio_codec='aac', preset=self.preset,
+                                      audio_bitrate=self.audio_bitrate, ffmpeg_params=["-crf", str(self.crf)])
+                logger.info(f"Video saved to {output_path}")
+                return output_path
             
             clips = []
-            for img_path in image_paths:
+            for img_path, img_duration in zip(image_paths, seconds):
+                # ImageGenerator already writes frames at the output size (FRAME_SIZE)
                 clip = ImageClip(img_path).with_duration(img_duration)
-                # Resize to 1080x1920 if needed, but DALL-E 3 generates 1024x1792 which is close enough for now
-                # or we can resize/crop. Let's just center it on a black background if needed.
-                # For simplicity, we assume the images are already vertical-ish.
+                if self.preview:
+                    clip = clip.resized(new_size=self.size)
                 clips.append(clip)
             
             # Concatenate clips
             video = concatenate_videoclips(clips, method="compose")
             
             # Add Subtitles if provided
-            if subtitles:
-                logger.info("Overlaying subtitles...")
-                text_clips = []
-                
-                # Group words into chunks of ~3-5 words for readability
-                chunk_size = 4
-                for i in range(0, len(subtitles), chunk_size):
-                    chunk = subtitles[i:i+chunk_size]
-                    if not chunk: continue
-                    
-                    # Handle both dict (if mocked) and object (if real API)
-                    first_word = chunk[0]
-                    last_word = chunk[-1]
-                    
-                    if isinstance(first_word, dict):
-                        text = " ".join([w['word'] for w in chunk])
-                        start_time = first_word['start']
-                        end_time = last_word['end']
-                    else:
-                        text = " ".join([w.word for w in chunk])
-                        start_time = first_word.start
-                        end_time = last_word.end
-                    
-                    # Create TextClip
-                    # Note: TextClip requires ImageMagick. If missing, this will fail.
-                    # We use a try/except block inside to warn but continue if it fails.
-                    try:
-                        txt_clip = TextClip(
-                            text=text,
-                            font_size=50,
-                            color='white',
-                            font='Arial-Bold',
-                            stroke_color='black',
-                            stroke_width=2,
-                            method='caption',
-                            size=(video.w * 0.8, None), # 80% width
-                            text_align='center'
-                        )
-                        txt_clip = txt_clip.with_position(('center', 'bottom')).with_start(start_time).with_end(end_time)
-                        text_clips.append(txt_clip)
-                    except Exception as e:
-                        logger.warning(f"Failed to create TextClip (ImageMagick missing?): {e}")
-                        break # Stop trying to add subtitles if one fails
-                
-                if text_clips:
-                    video = CompositeVideoClip([video, *text_clips])
+            captions = group_captions(subtitles)
+            if captions:
+                logger.info(f"Overlaying {len(captions)} captions...")
+                caption_clips = self._caption_clips(captions, video.w)
+                if caption_clips:
+                    video = CompositeVideoClip([video, *caption_clips])
             
             # Set audio
-            video = video.with_audio(audio)
+            video = self._checked(video).with_audio(audio)
             
             # Write file
-            video.write_videofile(output_path, fps=24, codec='libx264', audio_codec='aac')
+            video.write_videofile(output_path, fps=self.fps, codec='libx264', audio_codec='aac', preset=self.preset,
+                                  audio_bitrate=self.audio_bitrate, ffmpeg_params=["-crf", str(self.crf)])
             logger.info(f"Video saved to {output_path}")
             
             return output_path
@@ -99,3 +378,51 @@ class VideoComposer:
         except Exception as e:
             logger.error(f"Error composing video: {e}")
             raise
+
+    def _checked(self, clip):
+        """The clip with a memory-limit check before each frame is rendered."""
+        monitor = self._monitor
+        if monitor is None:
+            return clip
+        
+        def frame(get_frame, t):
+            monitor.check()
+            return get_frame(t)
+        return clip.transform(frame)
+
+    def _streaming_clip(self, image_paths: list, seconds: list, subtitles: list = None):
+        """One VideoClip whose frames are produced on demand, with captions blended in."""
+        captions = group_captions(subtitles)
+        if captions:
+            try:
+                render_caption(captions[0]['text'], self.size[0])
+            except Exception as e:
+                logger.warning(f"Failed to render caption, continuing without subtitles: {e}")
+                captions = []
+        source = StillFrameSource(image_paths, seconds, self.size, captions, self._monitor)
+        return VideoClip(frame_function=source, duration=sum(seconds))
+
+    def _caption_clips(self, captions: list, width: int) -> list:
+        """Overlay clips for the moviepy path: cached caption bitmaps, or TextClips when CAPTION_BITMAPS is off."""
+        clips = []
+        for caption in captions:
+            try:
+                if CAPTION_BITMAPS:
+                    clip = ImageClip(render_caption(caption['text'], width))
+                else:
+                    clip = TextClip(
+                        text=caption['text'],
+                        font_size=50,
+                        color='white',
+                        font='Arial-Bold',
+                        stroke_color='black',
+                        stroke_width=2,
+                        method='caption',
+                        size=(width * 0.8, None), # 80% width
+                        text_align='center'
+                    )
+            except Exception as e:
+                logger.warning(f"Failed to render caption, continuing without subtitles: {e}")
+                return []
+            clips.append(clip.with_position(('center', 'bottom')).with_start(caption['start']).with_end(caption['end']))
+        return clips
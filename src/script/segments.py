@@ -0,0 +1,247 @@
+import re
+
+# Optional list marker before a label: "- ", "* ", "1. ", "2) "
+LIST_MARKER = r'(?:(?:[-+•*]|\d+[.)])\s+)?'
+# Matches "**Tempo:** 0-5s", "Tempo: 0-5s", "**Visual**: ...", "- **Texto:** ..." etc.
+LABEL_PATTERN = re.compile(
+    r'^\s*' + LIST_MARKER + r'\*{0,2}\s*(Tempo|Visual|Texto|Narra[çc][ãa]o|Narration)\s*\*{0,2}\s*:\s*\*{0,2}\s*(.*)$',
+    re.IGNORECASE
+)
+# Any other bold label ("**Música:** ..."): starts a line of its own, never continues the previous field
+BOLD_LABEL_PATTERN = re.compile(r'^\s*' + LIST_MARKER + r'\*\*[^*]+?(?::\s*\*\*|\*\*\s*:)')
+# Older scripts sometimes inline cues as "[Visual: ...]"
+INLINE_VISUAL_PATTERN = re.compile(r'\[Visual:\s*(.*?)\]', re.IGNORECASE)
+# "0-5s", "0s - 5s", "5–10 s", "0:05-0:10"
+TEMPO_PATTERN = re.compile(r'(\d+(?::\d{1,2})?(?:[.,]\d+)?)\s*s?\s*[-–—a]\s*(\d+(?::\d{1,2})?(?:[.,]\d+)?)\s*s?', re.IGNORECASE)
+
+FIELDS = ("tempo", "visual", "narration")
+
+def _seconds(value: str) -> float:
+    value = value.replace(',', '.')
+    if ':' in value:
+        minutes, seconds = value.split(':', 1)
+        return int(minutes) * 60 + float(seconds)
+    return float(value)
+
+def parse_tempo(tempo: str):
+    """Parses a Tempo label such as "5-10s" into (start, end) seconds, or (None, None)."""
+    match = TEMPO_PATTERN.search(tempo or "")
+    if not match:
+        return None, None
+    start, end = _seconds(match.group(1)), _seconds(match.group(2))
+    return (start, end) if end > start else (None, None)
+
+class Segment:
+    """One Tempo/Visual/Texto block of a script."""
+    __slots__ = ("index", "start", "end", "tempo", "visual", "narration", "heading")
+
+    def __init__(self, index: int = 0, tempo: str = "", visual: str = "", narration: str = "", heading: str = ""):
+        self.index = index
+        self.tempo = tempo
+        self.visual = visual
+        self.narration = narration
+        self.heading = heading
+        self.start, self.end = parse_tempo(tempo)
+
+    @property
+    def duration(self):
+        return None if self.start is None else self.end - self.start
+
+    def set(self, field: str, value: str):
+        setattr(self, field, value)
+        if field == "tempo":
+            self.start, self.end = parse_tempo(value)
+
+    def copy(self) -> "Segment":
+        return Segment(self.index, self.tempo, self.visual, self.narration, self.heading)
+
+    def to_markdown(self) -> str:
+        lines = []
+        if self.heading:
+            lines.append(self.heading)
+        if self.tempo:
+            lines.append(f"**Tempo:** {self.tempo}")
+        if self.visual:
+            lines.append(f"**Visual:** {self.visual}")
+        if self.narration:
+            lines.append(f"**Texto:** {self.narration}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {"tempo": self.tempo, "visual": self.visual, "narration": self.narration, "heading": self.heading}
+
+    def __repr__(self):
+        return f"Segment({self.index}, {self.tempo!r}, visual={self.visual[:30]!r}, narration={self.narration[:30]!r})"
+
+class Script:
+    """
+    A video script parsed once into segments.
+
+    Built with `Script.parse` right after the script is generated or revised,
+    stored in chat state with `to_dict`, and handed to every downstream stage
+    (narration, images, subtitles) so none of them re-parse the markdown.
+    """
+    __slots__ = ("segments", "preamble", "epilogue")
+
+    def __init__(self, segments: list = None, preamble: str = "", epilogue: str = ""):
+        self.segments = segments or []
+        self.preamble = preamble
+        self.epilogue = epilogue
+        for i, segment in enumerate(self.segments):
+            segment.index = i
+
+    @classmethod
+    def parse(cls, markdown: str) -> "Script":
+        """
+        Splits a markdown script into its Tempo/Visual/Texto blocks.
+
+        Text around the blocks (titles, scene headings, closing notes) is kept
+        so the script can be rendered back. A script without labelled blocks
+        falls back to its "[Visual: ...]" or "Visual:" cues (one segment per
+        cue), with the remaining text as narration.
+        """
+        preamble, pending = [], []
+        segments = []
+        current = None
+        last_field = None
+
+        for line in (markdown or "").splitlines():
+            match = LABEL_PATTERN.match(line)
+            if match:
+                label, value = match.group(1).lower(), match.group(2).strip()
+                field = label if label in ("tempo", "visual") else "narration"
+                # A new block starts at "Tempo", or when a field repeats inside the current block
+                if current is None or field == "tempo" or getattr(current, field):
+                    heading = "\n".join(pending).strip() if current is not None else ""
+                    current = Segment(len(segments), heading=heading)
+                    segments.append(current)
+                    pending = []
+                current.set(field, value)
+                last_field = field
+            elif not line.strip():
+                last_field = None
+                pending.append(line)
+            elif current is None:
+                preamble.append(line)
+            elif BOLD_LABEL_PATTERN.match(line):
+                # A field this parser does not know (music, notes...); kept in place, not spoken
+                last_field = None
+                pending.append(line)
+            elif last_field:
+                # Wrapped continuation of the previous field
+                current.set(last_field, f"{getattr(current, last_field)} {line.strip()}".strip())
+            else:
+                # Scene titles etc. between blocks belong to the next block
+                pending.append(line)
+
+        if not segments:
+            return cls._parse_unstructured(markdown or "")
+
+        return cls(segments, "\n".join(preamble).strip(), "\n".join(pending).strip())
+
+    @classmethod
+    def _parse_unstructured(cls, markdown: str) -> "Script":
+        visuals = INLINE_VISUAL_PATTERN.findall(markdown)
+        narration_lines = []
+        for line in INLINE_VISUAL_PATTERN.sub('', markdown).splitlines():
+            if 'Visual:' in line:
+                visual = line.replace('Visual:', '').replace('*', '').strip()
+                if visual:
+                    visuals.append(visual)
+            elif line.strip():
+                narration_lines.append(line.strip())
+        narration = " ".join(narration_lines)
+        if not visuals:
+            return cls([Segment(0, narration=narration)]) if narration else cls()
+        # One segment per cue so each still gets its own image; the narration stays whole on the first
+        return cls([Segment(i, visual=v, narration=narration if i == 0 else "") for i, v in enumerate(visuals)])
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Script":
+        segments = [
+            Segment(i, s.get("tempo", ""), s.get("visual", ""), s.get("narration", ""), s.get("heading", ""))
+            for i, s in enumerate(data.get("segments", []))
+        ]
+        return cls(segments, data.get("preamble", ""), data.get("epilogue", ""))
+
+    def to_dict(self) -> dict:
+        return {
+            "preamble": self.preamble,
+            "segments": [s.to_dict() for s in self.segments],
+            "epilogue": self.epilogue,
+        }
+
+    def to_markdown(self) -> str:
+        parts = [self.preamble] + [s.to_markdown() for s in self.segments] + [self.epilogue]
+        return "\n\n".join(p for p in parts if p)
+
+    def copy(self) -> "Script":
+        return Script([s.copy() for s in self.segments], self.preamble, self.epilogue)
+
+    def visual_cues(self) -> list:
+        """Visual cue per segment that has one (one image each)."""
+        return [s.visual for s in self.segments if s.visual]
+
+    def visual_durations(self, narration_seconds: list = None) -> list:
+        """
+        On-screen time per visual cue (one per image), as weights for the composer.
+
+        With `narration_seconds` (measured audio length per narrated segment, in
+        order), each image lasts as long as the narration spoken while it is
+        shown: its own segment's plus that of following segments without a cue
+        (narration before the first cue goes to the first image). An image with
+        no narration keeps its scripted duration, or the average. Without
+        measurements the scripted (tempo) durations are used.
+        """
+        visual = [s for s in self.segments if s.visual]
+        narrated = [s for s in self.segments if s.narration]
+        if not narration_seconds or len(narration_seconds) != len(narrated) or not visual:
+            return [s.duration for s in visual]
+        
+        seconds = iter(narration_seconds)
+        spoken, shot = [0.0] * len(visual), -1
+        for s in self.segments:
+            if s.visual:
+                shot += 1
+            if s.narration:
+                spoken[max(shot, 0)] += next(seconds)
+        known = [t for t in spoken if t > 0]
+        average = sum(known) / len(known) if known else None
+        return [t or s.duration or average for t, s in zip(spoken, visual)]
+
+    def narration_text(self, separator: str = "\n") -> str:
+        """The words to be spoken, without labels, cues or headings."""
+        return separator.join(s.narration for s in self.segments if s.narration)
+
+    @property
+    def duration(self):
+        """End of the last timed segment, or None if the script has no timings."""
+        ends = [s.end for s in self.segments if s.end is not None]
+        return max(ends) if ends else None
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+def diff_segments(old_segments: list, new_segments: list) -> list:
+    """
+    Compares two segment lists position by position.
+
+    Returns:
+        list: One entry per position: {"index", "status": "unchanged"|"changed"|"added"|"removed",
+        "fields": [changed field names]}.
+    """
+    diff = []
+    for i in range(max(len(old_segments), len(new_segments))):
+        old = old_segments[i] if i < len(old_segments) else None
+        new = new_segments[i] if i < len(new_segments) else None
+        if old is None:
+            diff.append({"index": i, "status": "added", "fields": list(FIELDS)})
+        elif new is None:
+            diff.append({"index": i, "status": "removed", "fields": list(FIELDS)})
+        else:
+            fields = [f for f in FIELDS if (getattr(old, f) or "").strip() != (getattr(new, f) or "").strip()]
+            diff.append({"index": i, "status": "changed" if fields else "unchanged", "fields": fields})
+    return diff
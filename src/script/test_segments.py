@@ -0,0 +1,44 @@
+from src.script.segments import Script
+
+def test_labels_with_list_markers():
+    script = Script.parse(
+        "- **Tempo:** 0-5s\n"
+        "- **Visual:** A\n"
+        "- **Texto:** hello\n"
+        "\n"
+        "1. **Tempo:** 5-10s\n"
+        "2. **Visual:** B\n"
+        "3. **Texto:** world\n"
+    )
+    assert [s.visual for s in script] == ["A", "B"]
+    assert [s.narration for s in script] == ["hello", "world"]
+    assert [(s.start, s.end) for s in script] == [(0, 5), (5, 10)]
+
+def test_narration_label_alias():
+    script = Script.parse(
+        "**Tempo:** 0-5s\n"
+        "**Visual:** A\n"
+        "**Narração:** hello there\n"
+    )
+    assert script.segments[0].visual == "A"
+    assert script.segments[0].narration == "hello there"
+
+def test_unknown_bold_label_is_not_a_continuation():
+    script = Script.parse(
+        "**Tempo:** 0-5s\n"
+        "**Visual:** A\n"
+        "**Música:** calm piano\n"
+        "**Texto:** hello\n"
+    )
+    segment = script.segments[0]
+    assert segment.visual == "A"
+    assert segment.narration == "hello"
+    assert "calm piano" in script.to_markdown()
+
+def test_wrapped_field_continues():
+    script = Script.parse(
+        "**Visual:** A city\n"
+        "at night\n"
+        "**Texto:** hello\n"
+    )
+    assert script.segments[0].visual == "A city at night"
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+BLOB_COMPRESSION_LEVEL = int(os.getenv("BLOB_COMPRESSION_LEVEL", "6"))
+# Values whose JSON encoding is larger than this are kept out of chat state
+BLOB_INLINE_LIMIT = int(os.getenv("BLOB_INLINE_LIMIT", "4096"))
+
+REF_KEY = "$blob"
+
+class BlobStore:
+    """
+    Compressed, content-addressed storage on local disk.
+
+    Blobs are addressed by the SHA-256 of their uncompressed bytes and stored
+    as `<root>/<first 2 hex chars>/<digest>` (zlib-compressed). Writing the
+    same content twice is a no-op, so identical PDFs share a single blob.
+    """
+
+    def __init__(self, root: str = None, compression_level: int = None):
+        self.root = root or BLOB_STORE_DIR
+        self.compression_level = BLOB_COMPRESSION_LEVEL if compression_level is None else compression_level
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def put_bytes(self, data: bytes) -> str:
+        """Stores raw bytes and returns their SHA-256 hex digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data, self.compression_level))
+        os.replace(tmp_path, path)
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        with open(self._path(digest), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def put(self, value) -> dict:
+        """
+        Stores a str or JSON-serializable value and returns a reference to it.
+
+        Returns:
+            dict: {"$blob": digest, "type": "text"|"json", "size": n}
+        """
+        if isinstance(value, str):
+            kind, data = "text", value.encode('utf-8')
+        else:
+            kind, data = "json", json.dumps(value, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        return {REF_KEY: self.put_bytes(data), "type": kind, "size": len(data)}
+
+    def get(self, ref: dict):
+        """Loads the value behind a reference created by `put`."""
+        text = self.get_bytes(ref[REF_KEY]).decode('utf-8')
+        return text if ref.get("type") == "text" else json.loads(text)
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, dict) and REF_KEY in value
+
+blob_store = BlobStore()
+
+def offload(value, inline_limit: int = None):
+    """Returns a blob reference for large values and the value itself for small ones."""
+    limit = BLOB_INLINE_LIMIT if inline_limit is None else inline_limit
+    size = len(value.encode('utf-8')) if isinstance(value, str) else len(json.dumps(value, ensure_ascii=False))
+    if size <= limit:
+        return value
+    return blob_store.put(value)
+
+def resolve(value):
+    """Loads a value stored with `offload`/`put`; plain values are returned unchanged."""
+    if is_blob_ref(value):
+        return blob_store.get(value)
+    return value
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_ROOT = os.getenv("CACHE_DIR", "cache")
+
+class DiskCache:
+    """
+    Size-bounded LRU cache on local disk with optional TTL.
+
+    Values are files under `<root>/<aa>/<sha256(key)>`; an SQLite index keeps
+    size, last access and expiry per key. When a put pushes the cache past
+    `max_bytes` or `max_entries`, the least recently used entries are evicted.
+    Hit/miss counters are kept per instance (see `stats()`).
+    """
+
+    def __init__(self, name: str, max_bytes: int = None, max_entries: int = None, ttl: float = None, root: str = None):
+        self.name = name
+        self.dir = os.path.join(root or CACHE_ROOT, name)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.dir, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.dir, "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed_at ON entries(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Builds a stable key from JSON-serializable parts."""
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.dir, digest[:2], digest)
+
+    def path_for(self, key: str):
+        """Returns the file holding `key` (and refreshes its LRU position), or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            path = self._path(key)
+            if row is None or not os.path.exists(path):
+                self.misses += 1
+                return None
+            if row[0] is not None and row[0] < now:
+                self._delete(key)
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return path
+
+    def get_bytes(self, key: str):
+        path = self.path_for(key)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put_bytes(self, key: str, data: bytes, ttl: float = None) -> str:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._record(key, len(data), ttl)
+        return path
+
+    def get_json(self, key: str):
+        data = self.get_bytes(key)
+        return None if data is None else json.loads(data.decode('utf-8'))
+
+    def put_json(self, key: str, value, ttl: float = None):
+        self.put_bytes(key, json.dumps(value, ensure_ascii=False).encode('utf-8'), ttl)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._delete(key)
+            self._conn.commit()
+
+    def _delete(self, key: str):
+        self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _record(self, key: str, size: int, ttl: float = None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (key, size, accessed_at, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET size = excluded.size, accessed_at = excluded.accessed_at, "
+                "expires_at = excluded.expires_at",
+                (key, size, now, expires_at)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        for (key,) in self._conn.execute(
+            "SELECT key FROM entries WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+        ).fetchall():
+            self._delete(key)
+
+        total_bytes, total_entries = self._conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+        if not ((self.max_bytes and total_bytes > self.max_bytes) or (self.max_entries and total_entries > self.max_entries)):
+            return
+
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            if not ((self.max_bytes and total_bytes > self.max_bytes) or (self.max_entries and total_entries > self.max_entries)):
+                break
+            self._delete(key)
+            total_bytes -= size
+            total_entries -= 1
+            logger.debug(f"Evicted {key} from {self.name} cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total_bytes, total_entries = self._conn.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": total_entries,
+            "bytes": total_bytes,
+        }